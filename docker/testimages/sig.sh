@@ -8,9 +8,18 @@ sysctl -w net.ipv4.ip_forward=1
 sysctl -w net.ipv6.conf.all.forwarding=1
  # Register SIG routing table
 echo "11 sig" > /etc/iproute2/rt_tables
-for net in $(echo $1 | tr , ' '); do
+# $1 lists "ISD subnet" lines, aggregating the subnets of an ISD, and "ISD-AS subnet" lines,
+# with the ones of an AS. Route the other ISDs, and the other ASes of the ISD of the local AS $2,
+# via the SIG.
+isd=${2%%-*}
+while read -r scope net; do
+    if [ "${scope%%-*}" = "$scope" ]; then
+        [ "$scope" = "$isd" ] && continue
+    else
+        [ "${scope%%-*}" != "$isd" ] || [ "$scope" = "$2" ] && continue
+    fi
     ip rule add to "$net" lookup sig
-done
+done < "$1"
 
-shift
+shift 2
 exec /sbin/su-exec /app/sig -config conf/sig.toml
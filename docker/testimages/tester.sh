@@ -1,9 +1,17 @@
 #!/bin/bash
 set -ex
 
-if [ -n "$REMOTE_NETS" ] && [ -n "$SIG_IP" ]; then
-    for net in $(echo $REMOTE_NETS | tr , ' '); do
+if [ -n "$REMOTE_NETS_FILE" ] && [ -n "$SIG_IP" ]; then
+    # "ISD subnet" lines aggregate the subnets of an ISD, "ISD-AS subnet" the ones of an AS.
+    # Route the other ISDs, and the other ASes of the local ISD, via the SIG.
+    isd=${ISD_AS%%-*}
+    while read -r scope net; do
+        if [ "${scope%%-*}" = "$scope" ]; then
+            [ "$scope" = "$isd" ] && continue
+        else
+            [ "${scope%%-*}" != "$isd" ] || [ "$scope" = "$ISD_AS" ] && continue
+        fi
         ip route add "$net" via $SIG_IP dev eth0
-    done
+    done < "$REMOTE_NETS_FILE"
 fi
 tail -f /dev/null
@@ -0,0 +1,71 @@
+#!/usr/bin/python3
+# Copyright 2020 Anapaya Systems
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+:mod:`isd_as_codec` --- ISD-AS bulk codec benchmark
+===================================================
+
+Compares parsing and formatting ISD-AS strings one ISD_AS at a time with the bulk codec.
+
+Run from the repository root: PYTHONPATH=python/:. python/bench/isd_as_codec.py
+"""
+# Stdlib
+import argparse
+import time
+
+# SCION
+from lib.scion_addr import (
+    ISD_AS,
+    format_isd_as_list,
+    parse_isd_as_list,
+)
+
+DEFAULT_SIZES = (10000, 100000)
+
+
+def raws(count):
+    return ["%d-ff00:%x:%x" % (1 + i % 64, i >> 16, i & 0xffff) for i in range(count)]
+
+
+def per_item(strs):
+    ints = [ISD_AS(raw).int() for raw in strs]
+    return [str(ISD_AS.from_int(v)) for v in ints]
+
+
+def bulk(strs):
+    return format_isd_as_list(parse_isd_as_list(strs))
+
+
+def _timed(func, strs):
+    start = time.perf_counter()
+    out = func(strs)
+    return time.perf_counter() - start, out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-s', '--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help='Numbers of ISD-ASes to parse and format')
+    args = parser.parse_args()
+    print("%10s %12s %12s %8s %s" % ("ISD-ASes", "per-item (s)", "bulk (s)", "speedup", "same"))
+    for count in args.sizes:
+        strs = raws(count)
+        item_t, item_out = _timed(per_item, strs)
+        bulk_t, bulk_out = _timed(bulk, strs)
+        print("%10d %12.3f %12.3f %7.1fx %s" % (count, item_t, bulk_t, item_t / bulk_t,
+                                                item_out == bulk_out))
+
+
+if __name__ == "__main__":
+    main()
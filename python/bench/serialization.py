@@ -0,0 +1,104 @@
+#!/usr/bin/python3
+# Copyright 2020 Anapaya Systems
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+:mod:`serialization` --- Config serialisation benchmark
+=======================================================
+
+Loads the YAML, TOML and JSON files of a generated topology, and compares serialising them with
+the pure Python dumpers the generator used before, and with the dump functions of
+topology.serialize. Checks that both produce the same YAML and TOML, and the same JSON data.
+
+Run from the repository root, after generating a topology:
+PYTHONPATH=python/:. python/bench/serialization.py
+"""
+# Stdlib
+import argparse
+import json
+import os
+import time
+
+# External packages
+import toml
+import yaml
+
+# SCION
+from lib.defines import GEN_PATH
+from topology.serialize import YAML_DUMPER, dump_json, dump_toml, dump_yaml
+
+
+def legacy_yaml(data):
+    return yaml.dump(data, default_flow_style=False)
+
+
+def legacy_json(data):
+    return json.dumps(data, indent=2)
+
+
+def compact_json(data):
+    return dump_json(data, compact=True)
+
+
+# Per format: the file extensions, the loader, the previous and the new dumper, and whether
+# the new dumper writes the same text (rather than only the same data).
+FORMATS = (
+    ('yaml', ('.yml', '.yaml'), yaml.safe_load, legacy_yaml, dump_yaml, True),
+    ('toml', ('.toml',), toml.load, toml.dumps, dump_toml, True),
+    ('json', ('.json',), json.load, legacy_json, compact_json, False),
+)
+
+
+def load_docs(gen_dir, exts, load):
+    docs = []
+    for root, _, files in os.walk(gen_dir):
+        for name in sorted(files):
+            if os.path.splitext(name)[1] in exts:
+                with open(os.path.join(root, name)) as f:
+                    docs.append(load(f))
+    return docs
+
+
+def _timed(dump, docs, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        out = [dump(doc) for doc in docs]
+    return time.perf_counter() - start, out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-d', '--gen-dir', default=GEN_PATH,
+                        help='Directory of the generated topology')
+    parser.add_argument('-r', '--rounds', type=int, default=3,
+                        help='Number of times to serialise every file')
+    args = parser.parse_args()
+    print("YAML dumper: %s" % YAML_DUMPER.__name__)
+    print("%-6s %7s %12s %12s %8s %s" % ("format", "files", "legacy (s)", "fast (s)",
+                                         "speedup", "same"))
+    for name, exts, load, legacy, fast, same_text in FORMATS:
+        docs = load_docs(args.gen_dir, exts, load)
+        if not docs:
+            continue
+        legacy_t, legacy_out = _timed(legacy, docs, args.rounds)
+        fast_t, fast_out = _timed(fast, docs, args.rounds)
+        if same_text:
+            same = legacy_out == fast_out
+        else:
+            same = [json.loads(s) for s in legacy_out] == [json.loads(s) for s in fast_out]
+        print("%-6s %7d %12.3f %12.3f %7.1fx %s" % (name, len(docs), legacy_t, fast_t,
+                                                    legacy_t / fast_t, same))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/python3
+# Copyright 2020 Anapaya Systems
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+:mod:`subnet_alloc` --- Subnet allocator benchmark
+==================================================
+
+Compares SubnetGenerator.alloc_subnets with the ip_network based allocator it replaced, and
+checks that both hand out the same subnets.
+
+Run from the repository root: PYTHONPATH=python/:. python/bench/subnet_alloc.py
+"""
+# Stdlib
+import argparse
+import logging
+import math
+import sys
+import time
+from collections import defaultdict
+from ipaddress import ip_network
+
+# SCION
+from topology.net import (
+    DEFAULT_NETWORK,
+    SubnetGenerator,
+    _workaround_ip_network_hosts_py35,
+)
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+
+
+class LegacySubnetGenerator(SubnetGenerator):
+    """
+    The previous allocator, which carves subnets out of free lists of ip_network objects.
+    """
+
+    def __init__(self, network, docker, in_docker):
+        super().__init__(network, docker, in_docker)
+        self._allocations = defaultdict(list)
+        exclude = ip_network("127.0.0.0/30")
+        if self._net.overlaps(exclude):
+            self._exclude_net(self._net, exclude)
+            return
+        self._allocations[self._net.prefixlen].append(self._net)
+
+    def alloc_subnets(self):
+        max_prefix = self._net.max_prefixlen
+        networks = {}
+        for topo, subnet in sorted(self._subnets.items(), key=lambda x: str(x)):
+            if not self.docker:
+                if len(subnet) == 2:
+                    req_prefix = max_prefix - 1
+                else:
+                    req_prefix = max_prefix - math.ceil(math.log2(len(subnet) + 2))
+            else:
+                req_prefix = max_prefix - math.ceil(math.log2(len(subnet) + 3))
+            for prefix in range(req_prefix, -1, -1):
+                if not self._allocations[prefix]:
+                    continue
+                alloc = self._allocations[prefix].pop()
+                new_net = next(alloc.subnets(new_prefix=req_prefix))
+                new_net = _workaround_ip_network_hosts_py35(new_net)
+                networks[new_net] = subnet.alloc_addrs(new_net)
+                self._exclude_net(alloc, new_net)
+                break
+            else:
+                logging.critical("Unable to allocate /%d subnet" % req_prefix)
+                sys.exit(1)
+        return networks
+
+    def _exclude_net(self, alloc, net):
+        for net in alloc.address_exclude(net):
+            self._allocations[net.prefixlen].append(net)
+
+
+def populate(gen, count):
+    """
+    Register count subnets: three quarters are links between two BRs, the rest are ASes with
+    a handful of elements.
+    """
+    for i in range(count):
+        if i % 4:
+            subnet = gen.register("link%d" % i)
+            subnet.register("br%d-a" % i)
+            subnet.register("br%d-b" % i)
+        else:
+            subnet = gen.register("as%d" % i)
+            for elem in ("cs", "sd", "tester", "br_ctrl"):
+                subnet.register("%s%d" % (elem, i))
+
+
+def run(cls, count, docker):
+    gen = cls(DEFAULT_NETWORK, docker, False)
+    populate(gen, count)
+    start = time.perf_counter()
+    networks = gen.alloc_subnets()
+    return time.perf_counter() - start, networks
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-s', '--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help='Numbers of subnets to allocate')
+    parser.add_argument('-d', '--docker', action='store_true',
+                        help='Allocate subnets as for a docker topology')
+    args = parser.parse_args()
+    print("%10s %12s %12s %8s %s" % ("subnets", "legacy (s)", "buddy (s)", "speedup", "same"))
+    for count in args.sizes:
+        legacy_t, legacy_nets = run(LegacySubnetGenerator, count, args.docker)
+        buddy_t, buddy_nets = run(SubnetGenerator, count, args.docker)
+        same = list(legacy_nets) == list(buddy_nets)
+        print("%10d %12.3f %12.3f %7.1fx %s" % (count, legacy_t, buddy_t, legacy_t / buddy_t,
+                                                same))
+
+
+if __name__ == "__main__":
+    main()
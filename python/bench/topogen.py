@@ -0,0 +1,344 @@
+#!/usr/bin/python3
+# Copyright 2020 Anapaya Systems
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+:mod:`topogen` --- Topology generator benchmark
+===============================================
+
+Synthesises topologies of increasing size, runs the ConfigGenerator on each of them and
+reports the time spent, and the files written, in every generation stage and the peak RSS, as
+JSON. The stages are the ones of the generator's --profile mode, with the subnet allocation
+split out of the topology stage.
+
+Two shapes are supported, both scaled to the requested number of ASes:
+
+- tiny: a single ISD with one core AS and a tree of non-core ASes below it.
+- wide: many small ISDs, each with a mesh of core ASes that is linked to the cores of the
+  neighbouring ISDs, and non-core ASes attached below the cores.
+
+On top of the tree, the link density adds PEER links between random non-core ASes.
+
+With --colibri, the planning of the colibri reservations is split out of the go stage. The
+--check-colibri mode plans them for a wide topology of COLIBRI_CHECK_SIZE ASes, and fails if the
+planning takes more than COLIBRI_MAX_SHARE of the generation time.
+
+Run from the repository root: PYTHONPATH=python/:. python/bench/topogen.py
+"""
+# Stdlib
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+# External packages
+import yaml
+
+# SCION
+from lib.defines import GEN_PROFILE_FILE
+from topology import go
+from topology.cert import CertGenerator
+from topology.colibri import ColibriPlanner
+from topology.config import ConfigGenerator, ConfigGenArgs
+from topology.generator import add_arguments
+
+DEFAULT_SIZES = (10, 100, 1000, 10000)
+SHAPES = ('tiny', 'wide')
+# Number of ASes per ISD in the wide shape, half of which are core ASes.
+WIDE_ISD_SIZE = 4
+# Network of the docker layout, large enough for the biggest topologies.
+DOCKER_NETWORK = "10.0.0.0/8"
+# Number of children per AS in the AS trees below the cores.
+FANOUT = 4
+# Number of ASes of the topology of the --check-colibri mode.
+COLIBRI_CHECK_SIZE = 300
+# Share of the generation time the colibri planning may take in the --check-colibri mode.
+COLIBRI_MAX_SHARE = 0.2
+
+
+def _ia(isd, idx):
+    return "%d-ff00:0:%x" % (isd, 0x100 + idx)
+
+
+def _core():
+    return {'core': True, 'voting': True, 'authoritative': True, 'issuing': True}
+
+
+def _tree(ases, links, isd, roots, first, count):
+    """
+    Attach count non-core ASes of isd below roots, with at most FANOUT children per AS.
+
+    :returns: the list of attached ASes.
+    """
+    attached = []
+    parents, children = list(roots), []
+    for idx in range(first, first + count):
+        ia = _ia(isd, idx)
+        ases[ia] = {'cert_issuer': roots[0]}
+        links.append({'a': parents[len(children) // FANOUT], 'b': ia, 'linkAtoB': 'CHILD'})
+        children.append(ia)
+        attached.append(ia)
+        if len(children) == FANOUT * len(parents):
+            parents, children = children, []
+    return attached
+
+
+def synth_topo(shape, size, density, seed):
+    """
+    Synthesise a topology config.
+
+    :param str shape: 'tiny' or 'wide'.
+    :param int size: the number of ASes.
+    :param float density: the number of additional PEER links, per AS.
+    :param int seed: the seed of the random placement of the PEER links.
+    :returns: the topology config dict, as loaded from a .topo file.
+    """
+    rnd = random.Random(seed)
+    ases = {}
+    links = []
+    leaves = []
+    if shape == 'tiny':
+        root = _ia(1, 0x10)
+        ases[root] = _core()
+        leaves = _tree(ases, links, 1, [root], 0x11, size - 1)
+    else:
+        prev_cores = None
+        # AS numbers are unique across ISDs.
+        first = 0x10
+        isds = max(1, size // WIDE_ISD_SIZE)
+        for isd in range(1, isds + 1):
+            isd_size = WIDE_ISD_SIZE if isd < isds else size - WIDE_ISD_SIZE * (isds - 1)
+            isd_ases = {}
+            cores = [_ia(isd, first + i) for i in range(max(1, isd_size // 2))]
+            for i, core in enumerate(cores):
+                isd_ases[core] = _core()
+                for other in cores[:i]:
+                    links.append({'a': other, 'b': core, 'linkAtoB': 'CORE'})
+            if prev_cores:
+                links.append({'a': prev_cores[-1], 'b': cores[0], 'linkAtoB': 'CORE'})
+            leaves.extend(_tree(isd_ases, links, isd, cores, first + len(cores),
+                                isd_size - len(cores)))
+            first += isd_size
+            ases.update(isd_ases)
+            prev_cores = cores
+    peers = set()
+    if len(leaves) > 1:
+        while len(peers) < int(density * size):
+            a, b = sorted(rnd.sample(leaves, 2))
+            peers.add((a, b))
+    for a, b in sorted(peers):
+        links.append({'a': a, 'b': b, 'linkAtoB': 'PEER'})
+    return {'ASes': ases, 'links': links}
+
+
+class BenchConfigGenerator(ConfigGenerator):
+    """
+    ConfigGenerator that additionally records the time spent allocating subnets, which is part
+    of the topology stage.
+    """
+
+    def __init__(self, args):
+        super().__init__(args)
+        self.subnet_time = 0
+        for subnet_gen in (self.subnet_gen4, self.subnet_gen6):
+            subnet_gen.alloc_subnets = self._timed_alloc(subnet_gen.alloc_subnets)
+
+    def _timed_alloc(self, alloc_subnets):
+        def wrapper():
+            start = time.perf_counter()
+            try:
+                return alloc_subnets()
+            finally:
+                self.subnet_time += time.perf_counter() - start
+        return wrapper
+
+
+class BenchColibriPlanner(ColibriPlanner):
+    """
+    ColibriPlanner that records the time spent planning, which is part of the go stage.
+    """
+    plan_time = 0
+
+    def __init__(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            super().__init__(*args, **kwargs)
+        finally:
+            BenchColibriPlanner.plan_time += time.perf_counter() - start
+
+
+def _skip_certs():
+    for method in ('generate', 'generate_isds', 'copy_files'):
+        setattr(CertGenerator, method, lambda self, topo_dicts: None)
+
+
+def run(shape, size, density, seed, gen_args, certs):
+    """
+    Generate one topology, in a fresh interpreter so that the peak RSS is its own.
+
+    :returns: the result dict of the run.
+    """
+    if not certs:
+        _skip_certs()
+    go.ColibriPlanner = BenchColibriPlanner
+    topo = synth_topo(shape, size, density, seed)
+    res = {'shape': shape, 'ases': size, 'links': len(topo['links'])}
+    with tempfile.TemporaryDirectory(prefix='topogen-bench-') as tmp:
+        topo_file = os.path.join(tmp, 'bench.topo')
+        with open(topo_file, 'w') as f:
+            yaml.safe_dump(topo, f)
+        out_dir = os.path.join(tmp, 'gen')
+        parser = add_arguments(argparse.ArgumentParser())
+        args = parser.parse_args(['-c', topo_file, '-o', out_dir, '--profile'] + gen_args)
+        try:
+            confgen = BenchConfigGenerator(ConfigGenArgs(args))
+            confgen.generate_all()
+        except (Exception, SystemExit) as e:
+            res['error'] = repr(e)
+            return res
+        with open(os.path.join(out_dir, GEN_PROFILE_FILE)) as f:
+            profile = json.load(f)
+    stages = {'subnets': {'WallTime': confgen.subnet_time}}
+    for stage in profile['Stages']:
+        stages[stage['Stage']] = {k: v for k, v in stage.items() if k != 'Stage'}
+    stages['topology']['WallTime'] -= confgen.subnet_time
+    if '--colibri' in gen_args:
+        stages['colibri'] = {'WallTime': BenchColibriPlanner.plan_time}
+        stages['go']['WallTime'] -= BenchColibriPlanner.plan_time
+    res['stages'] = stages
+    res['total'] = profile['WallTime']
+    # ru_maxrss is in KiB on Linux.
+    res['peak_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return res
+
+
+def _check_colibri(results):
+    """
+    :returns: whether all runs succeeded, and planned the colibri reservations in at most
+        COLIBRI_MAX_SHARE of their time.
+    """
+    ok = True
+    for res in results:
+        if 'error' in res:
+            ok = False
+            continue
+        share = res['stages']['colibri']['WallTime'] / res['total']
+        if share > COLIBRI_MAX_SHARE:
+            print("%-5s %6d ASes: colibri planning took %d%% of the time, more than %d%%" % (
+                res['shape'], res['ases'], 100 * share, 100 * COLIBRI_MAX_SHARE),
+                file=sys.stderr)
+            ok = False
+    return ok
+
+
+def _commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-s', '--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help='Numbers of ASes to generate topologies for')
+    parser.add_argument('--shapes', nargs='+', choices=SHAPES, default=SHAPES,
+                        help='Shapes of the generated topologies')
+    parser.add_argument('--density', type=float, default=0.5,
+                        help='Number of additional PEER links, per AS')
+    parser.add_argument('--seed', type=int, default=1,
+                        help='Seed of the synthesised topologies')
+    parser.add_argument('--layout', choices=('docker', 'supervisor'), default='docker',
+                        help='Generate a docker-compose or a supervisor configuration. The\
+                        supervisor layout allocates ports from a single range, which only\
+                        suffices for a few hundred ASes')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Number of worker processes of the generator')
+    parser.add_argument('--stream', action='store_true',
+                        help='Run the generator in the streaming mode')
+    parser.add_argument('--colibri', action='store_true',
+                        help='Also generate the colibri services and their reservations')
+    parser.add_argument('--check-colibri', action='store_true',
+                        help='Only generate a wide topology of %d ASes with --colibri, and fail\
+                        if planning the reservations takes more than %d%% of the time' % (
+                            COLIBRI_CHECK_SIZE, 100 * COLIBRI_MAX_SHARE))
+    parser.add_argument('--certs', action='store_true',
+                        help='Also generate the crypto material (requires ./bin/scion-pki)')
+    parser.add_argument('--timeout', type=float,
+                        help='Abort a run after this many seconds, and record it as failed')
+    parser.add_argument('-o', '--output', help='File to write the results to (default: stdout)')
+    args = parser.parse_args()
+    if args.check_colibri:
+        args.sizes, args.shapes, args.colibri = [COLIBRI_CHECK_SIZE], ['wide'], True
+    # The generator always resolves the docker host. Take it from the environment rather than
+    # querying docker for it.
+    gen_args = ['-j', str(args.jobs), '--in-docker']
+    os.environ.setdefault('DOCKER0', '172.17.0.1')
+    if args.stream:
+        gen_args.append('--stream')
+    if args.colibri:
+        gen_args.append('--colibri')
+    if args.layout == 'docker':
+        # The default docker network only has room for a few hundred ASes.
+        gen_args += ['-d', '-n', DOCKER_NETWORK]
+    ctx = multiprocessing.get_context('spawn')
+    results = []
+    for shape in args.shapes:
+        for size in args.sizes:
+            with ctx.Pool(1) as pool:
+                job = pool.apply_async(run, (shape, size, args.density, args.seed, gen_args,
+                                             args.certs))
+                try:
+                    res = job.get(args.timeout)
+                except multiprocessing.TimeoutError:
+                    res = {'shape': shape, 'ases': size,
+                           'error': 'timed out after %ss' % args.timeout}
+            results.append(res)
+            if 'error' in res:
+                print("%-5s %6d ASes: failed: %s" % (shape, size, res['error']), file=sys.stderr)
+                continue
+            print("%-5s %6d ASes %6d links: %8.3fs, peak RSS %7d KiB" % (
+                shape, size, res['links'], res['total'], res['peak_rss_kb']),
+                file=sys.stderr)
+            if args.colibri:
+                print("%-5s %6d ASes: colibri planning %8.3fs" % (
+                    shape, size, res['stages']['colibri']['WallTime']), file=sys.stderr)
+    report = {
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'timestamp': int(time.time()),
+        'params': {'density': args.density, 'seed': args.seed, 'layout': args.layout,
+                   'jobs': args.jobs, 'stream': args.stream, 'colibri': args.colibri,
+                   'certs': args.certs},
+        'results': results,
+    }
+    out = json.dumps(report, indent=2) + '\n'
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(out)
+    else:
+        sys.stdout.write(out)
+    if args.check_colibri and not _check_colibri(results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -29,6 +29,12 @@ IFIDS_FILE = "ifids.yml"
 AS_LIST_FILE = "as_list.yml"
 #: Prometheus config
 PROM_FILE = "prometheus.yml"
+#: Manifest of the generated output
+GEN_MANIFEST_FILE = "gen-manifest.json"
+#: Profile of the generator run
+GEN_PROFILE_FILE = "gen-profile.json"
+#: Directory for the cProfile dumps of the generator stages
+GEN_PROFILE_DIR = "gen-profile"
 
 #: Default SCION router UDP port.
 SCION_ROUTER_PORT = 50000
@@ -16,10 +16,19 @@
 =======================================================
 """
 
+# Stdlib
+import re
+from array import array
+
 # SCION
 from lib.errors import SCIONParseError
 
 
+# Instances parsed from the same string are shared, keyed by (class, string), for the classes
+# that opt in. The table is never cleared, so only short-lived processes should opt in.
+_INTERNED = {}
+
+
 class ISD_AS:
     """
     Class for representing ISD-AS pair. The underlying type is a 64-bit unsigned int; ISD is
@@ -27,7 +36,11 @@ class ISD_AS:
     lower 48 bits.
     See formatting and allocations here:
     https://github.com/scionproto/scion/wiki/ISD-and-AS-numbering
+
+    Instances are immutable: they hash and compare on the 64-bit int, and cache their string
+    formats. Subclasses can opt in to sharing the instances parsed from the same string.
     """
+    __slots__ = ('_isd', '_as', '_int', '_str', '_file_str')
     ISD_BITS = 16
     MAX_ISD = (1 << ISD_BITS) - 1
     AS_BITS = 48
@@ -38,12 +51,46 @@ class ISD_AS:
     HEX_SEPARATOR = ":"
     HEX_FILE_SEPARATOR = "_"
     MAX_HEX_AS_PART = 0xffff
+    # Whether instances parsed from the same string are shared.
+    INTERN = False
+
+    def __new__(cls, raw=None):
+        if not raw or not cls.INTERN:
+            return super().__new__(cls)
+        key = (cls, raw)
+        inst = _INTERNED.get(key)
+        if inst is None:
+            inst = super().__new__(cls)
+            inst._init(raw)
+            _INTERNED[key] = inst
+        return inst
 
     def __init__(self, raw=None):
+        if raw and self.INTERN:
+            # Initialised by __new__.
+            return
+        self._init(raw)
+
+    def _init(self, raw):
         self._isd = 0
         self._as = 0
         if raw:
             self._parse(raw)
+        self._set_int()
+
+    def _set_int(self):
+        self._int = (self._isd << self.AS_BITS) | (self._as & self.MAX_AS)
+        self._str = None
+        self._file_str = None
+
+    @classmethod
+    def from_int(cls, raw):
+        """
+        :param int raw: a packed 64-bit ISD-AS.
+        """
+        inst = cls()
+        inst._parse_int(raw)
+        return inst
 
     def _parse(self, raw):
         """
@@ -103,11 +150,10 @@ class ISD_AS:
         """
         self._isd = raw >> self.AS_BITS
         self._as = raw & self.MAX_AS
+        self._set_int()
 
     def int(self):
-        isd_as = self._isd << self.AS_BITS
-        isd_as |= self._as & self.MAX_AS
-        return isd_as
+        return self._int
 
     def any_as(self):  # pragma: no cover
         return self.from_values(self._isd, 0)
@@ -115,8 +161,10 @@ class ISD_AS:
     def is_zero(self):  # pragma: no cover
         return self._isd == 0 and self._as == 0
 
-    def __eq__(self, other):  # pragma: no cover
-        return self._isd == other._isd and self._as == other._as
+    def __eq__(self, other):
+        if not isinstance(other, ISD_AS):
+            return NotImplemented
+        return self._int == other._int
 
     def isd_str(self):
         s = str(self._isd)
@@ -130,21 +178,22 @@ class ISD_AS:
             return "%s [Illegal AS: larger than %d]" % (dec_str, self.MAX_AS)
         if self._as <= self.MAX_BGP_AS:
             return str(self._as)
-        s = []
-        as_ = self._as
-        for i in range(self.HEX_AS_PARTS):
-            s.insert(0, "%x" % (as_ & self.MAX_HEX_AS_PART))
-            as_ >>= 16
-        return sep.join(s)
+        return _hex_as_str(self._as, sep)
 
     def as_file_fmt(self):
         return self.as_str(self.HEX_FILE_SEPARATOR)
 
     def file_fmt(self):
-        return "%s-%s" % (self.isd_str(), self.as_file_fmt())
+        if self._file_str is None:
+            self._file_str = "%s-%s" % (self.isd_str(), self.as_file_fmt())
+        return self._file_str
 
     def __str__(self, as_sep=HEX_SEPARATOR):
-        return "%s-%s" % (self.isd_str(), self.as_str(as_sep))
+        if as_sep != self.HEX_SEPARATOR:
+            return "%s-%s" % (self.isd_str(), self.as_str(as_sep))
+        if self._str is None:
+            self._str = "%s-%s" % (self.isd_str(), self.as_str())
+        return self._str
 
     def __repr__(self):  # pragma: no cover
         return "ISD_AS(isd=%s, as=%s)" % (self._isd, self._as)
@@ -152,5 +201,72 @@ class ISD_AS:
     def __len__(self):  # pragma: no cover
         return self.LEN
 
-    def __hash__(self):  # pragma: no cover
-        return hash(str(self))
+    def __hash__(self):
+        return hash(self._int)
+
+
+# Matches the canonical forms of ISD-AS strings: a decimal ISD, and a decimal BGP AS or a hex AS
+# in three parts with a consistent separator. Anything else is left to ISD_AS to parse or reject.
+_ISD_AS_RE = re.compile(r"(\d+)-(?:([0-9a-fA-F]+)([:_])([0-9a-fA-F]+)\3([0-9a-fA-F]+)|(\d+))\Z")
+
+
+def parse_isd_as_list(raws):
+    """
+    Parse ISD-AS strings in bulk.
+
+    :param raws: iterable of strings of the format "isd-as", with the AS in hex (with either the
+        normal or the file separator) or decimal format.
+    :returns: array('Q') of the ISD-ASes as packed 64-bit ints, in the order of raws.
+    :raises SCIONParseError: if a string is not a valid ISD-AS.
+    """
+    out = array('Q')
+    append = out.append
+    match = _ISD_AS_RE.match
+    max_part = ISD_AS.MAX_HEX_AS_PART
+    for raw in raws:
+        m = match(raw)
+        if m is None:
+            append(ISD_AS(raw).int())
+            continue
+        isd_s, as1, _, as2, as3, dec_as = m.groups()
+        isd = int(isd_s)
+        if dec_as is not None:
+            as_ = int(dec_as)
+            valid = as_ <= ISD_AS.MAX_BGP_AS
+        else:
+            a1, a2, a3 = int(as1, 16), int(as2, 16), int(as3, 16)
+            valid = a1 <= max_part and a2 <= max_part and a3 <= max_part
+            as_ = (a1 << 32) | (a2 << 16) | a3
+        if not valid or isd > ISD_AS.MAX_ISD:
+            # Raises with the detailed error.
+            ISD_AS(raw)
+        append((isd << ISD_AS.AS_BITS) | as_)
+    return out
+
+
+def format_isd_as_list(ints, sep=ISD_AS.HEX_SEPARATOR):
+    """
+    Format packed ISD-ASes in bulk, like str(ISD_AS).
+
+    :param ints: iterable of ISD-ASes as packed 64-bit ints, e.g. from parse_isd_as_list.
+    :param str sep: the separator of the hex AS parts, use ISD_AS.HEX_FILE_SEPARATOR for the
+        file format.
+    :returns: list of the ISD-AS strings, in the order of ints.
+    """
+    as_bits = ISD_AS.AS_BITS
+    max_as = ISD_AS.MAX_AS
+    max_bgp_as = ISD_AS.MAX_BGP_AS
+    fmt = "%d-%x" + sep + "%x" + sep + "%x"
+    out = []
+    append = out.append
+    for v in ints:
+        as_ = v & max_as
+        if as_ <= max_bgp_as:
+            append("%d-%d" % (v >> as_bits, as_))
+        else:
+            append(fmt % (v >> as_bits, as_ >> 32, (as_ >> 16) & 0xffff, as_ & 0xffff))
+    return out
+
+
+def _hex_as_str(as_, sep):
+    return "%x%s%x%s%x" % (as_ >> 32, sep, (as_ >> 16) & 0xffff, sep, as_ & 0xffff)
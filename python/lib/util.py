@@ -19,6 +19,7 @@ Various utilities for SCION functionality.
 """
 # Stdlib
 import os
+import shutil
 
 # External packages
 import json
@@ -34,16 +35,21 @@ from lib.errors import (
 def write_file(file_path, text):
     """
     Write some text into a temporary file, creating its directory as needed, and
-    then atomically move to target location.
+    then atomically move to target location. If the file already exists with
+    identical content, it is left untouched.
 
     :param str file_path: the path to the file.
     :param str text: the file content.
+    :returns: False if the file was already up to date, True otherwise.
+    :rtype: bool
     :raises:
         lib.errors.SCIONIOError: IO error occurred
     """
     # ":" is an illegal filename char on both windows and OSX, so disallow it globally to prevent
     # incompatibility.
     assert ":" not in file_path, file_path
+    if _file_matches(file_path, text):
+        return False
     dir_ = os.path.dirname(file_path)
     try:
         os.makedirs(dir_, exist_ok=True)
@@ -62,6 +68,73 @@ def write_file(file_path, text):
     except OSError as e:
         raise SCIONIOError("Error moving '%s' to '%s': %s" %
                            (tmp_file, file_path, e.strerror)) from None
+    return True
+
+
+def _file_matches(file_path, text):
+    """
+    Check whether the file at file_path exists and contains exactly text.
+    """
+    if not os.path.isfile(file_path):
+        return False
+    data = text.encode()
+    try:
+        if os.path.getsize(file_path) != len(data):
+            return False
+        with open(file_path, 'rb') as f:
+            return f.read() == data
+    except OSError:
+        return False
+
+
+def link_file(src, dst):
+    """
+    Make the file at src available at dst, replacing dst atomically if it exists. A hard link is
+    used where possible, falling back to a copy, e.g. across file systems.
+
+    :param str src: the path to the source file.
+    :param str dst: the path to the destination file.
+    :raises:
+        lib.errors.SCIONIOError: IO error occurred
+    """
+    tmp_file = dst + ".new"
+    try:
+        if not os.path.islink(dst) and os.path.exists(dst) and os.path.samefile(src, dst):
+            return
+        if os.path.lexists(tmp_file):
+            os.remove(tmp_file)
+        try:
+            os.link(src, tmp_file)
+        except OSError:
+            shutil.copy(src, tmp_file)
+        os.rename(tmp_file, dst)
+    except OSError as e:
+        raise SCIONIOError("Error linking '%s' to '%s': %s" %
+                           (src, dst, e.strerror)) from None
+
+
+def symlink_file(src, dst):
+    """
+    Make dst a symbolic link to the file at src, relative to the directory of dst, replacing dst
+    atomically if it exists.
+
+    :param str src: the path to the source file.
+    :param str dst: the path to the destination file.
+    :raises:
+        lib.errors.SCIONIOError: IO error occurred
+    """
+    target = os.path.relpath(src, os.path.dirname(dst))
+    tmp_file = dst + ".new"
+    try:
+        if os.path.islink(dst) and os.readlink(dst) == target:
+            return
+        if os.path.lexists(tmp_file):
+            os.remove(tmp_file)
+        os.symlink(target, tmp_file)
+        os.rename(tmp_file, dst)
+    except OSError as e:
+        raise SCIONIOError("Error linking '%s' to '%s': %s" %
+                           (src, dst, e.strerror)) from None
 
 
 def load_yaml_file(file_path):
@@ -0,0 +1,91 @@
+# Copyright 2020 Anapaya Systems
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+:mod:`lib_scion_addr_test` --- lib.scion_addr unit tests
+========================================================
+"""
+# External packages
+import nose
+import nose.tools as ntools
+
+# SCION
+from lib.errors import SCIONParseError
+from lib.scion_addr import (
+    ISD_AS,
+    format_isd_as_list,
+    parse_isd_as_list,
+)
+
+
+class TestISDAS(object):
+    """
+    Unit tests for lib.scion_addr.ISD_AS
+    """
+    def test_parse(self):
+        ia = ISD_AS("1-ff00:0:110")
+        ntools.eq_(ia.int(), (1 << 48) | 0xff0000000110)
+        ntools.eq_(str(ia), "1-ff00:0:110")
+        ntools.eq_(ia.file_fmt(), "1-ff00_0_110")
+        ntools.eq_(ISD_AS("1-ff00_0_110"), ia)
+        ntools.eq_(str(ISD_AS("2-64512")), "2-64512")
+
+    def test_parse_error(self):
+        for raw in ("1", "1-ff00:0", "1-fffff:0:1", "65536-1"):
+            ntools.assert_raises(SCIONParseError, ISD_AS, raw)
+
+    def test_hash_eq(self):
+        a = ISD_AS("1-ff00:0:110")
+        b = ISD_AS("1-ff00_0_110")
+        ntools.eq_(a, b)
+        ntools.eq_(hash(a), hash(b))
+        ntools.assert_not_equal(a, ISD_AS("1-ff00:0:111"))
+        ntools.assert_not_equal(a, "1-ff00:0:110")
+
+    def test_not_interned(self):
+        ntools.assert_is_not(ISD_AS("1-ff00:0:110"), ISD_AS("1-ff00:0:110"))
+
+    def test_interned(self):
+        class Interned(ISD_AS):
+            __slots__ = ()
+            INTERN = True
+        ntools.assert_is(Interned("1-ff00:0:110"), Interned("1-ff00:0:110"))
+        ntools.assert_is_not(Interned(), Interned())
+        ntools.assert_is_not(Interned("1-ff00:0:110"), ISD_AS("1-ff00:0:110"))
+
+
+class TestISDASList(object):
+    """
+    Unit tests for lib.scion_addr.parse_isd_as_list and format_isd_as_list
+    """
+    RAWS = ["1-ff00:0:110", "2-ff00_0_1", "3-64512", "65535-ffff:ffff:ffff", "1-0"]
+
+    def test_parse(self):
+        ntools.eq_(list(parse_isd_as_list(self.RAWS)), [ISD_AS(r).int() for r in self.RAWS])
+
+    def test_parse_error(self):
+        for raw in ("1-ff00:0", "1-ff00:0_1", "1-fffff:0:1", "65536-1", "1-4294967296"):
+            ntools.assert_raises(SCIONParseError, parse_isd_as_list, ["1-1", raw])
+
+    def test_format(self):
+        ints = parse_isd_as_list(self.RAWS)
+        ntools.eq_(format_isd_as_list(ints), [str(ISD_AS(r)) for r in self.RAWS])
+        ntools.eq_(format_isd_as_list(ints, ISD_AS.HEX_FILE_SEPARATOR),
+                   [ISD_AS(r).file_fmt() for r in self.RAWS])
+
+    def test_from_int(self):
+        ntools.eq_(ISD_AS.from_int(ISD_AS("1-ff00:0:110").int()), ISD_AS("1-ff00:0:110"))
+
+
+if __name__ == "__main__":
+    nose.run(defaultTest=__name__)
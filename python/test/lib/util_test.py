@@ -30,7 +30,9 @@ from lib.errors import (
     SCIONYAMLError,
 )
 from lib.util import (
+    link_file,
     load_yaml_file,
+    symlink_file,
     write_file,
 )
 
@@ -75,6 +77,121 @@ class TestWriteFile(object):
         # Call
         ntools.assert_raises(SCIONIOError, write_file, "File_Path", "Text")
 
+    @patch("lib.util.os.rename", autospec=True)
+    @patch.object(builtins, 'open', mock_open(read_data=b"Text"))
+    @patch("lib.util.os.path.getsize", autospec=True)
+    @patch("lib.util.os.path.isfile", autospec=True)
+    def test_unchanged(self, isfile, getsize, rename):
+        isfile.return_value = True
+        getsize.return_value = 4
+        # Call
+        ntools.assert_false(write_file("File_Path", "Text"))
+        # Tests
+        builtins.open.assert_called_once_with("File_Path", 'rb')
+        ntools.assert_false(rename.called)
+
+    @patch("lib.util.os.rename", autospec=True)
+    @patch.object(builtins, 'open', mock_open(read_data=b"Old"))
+    @patch("lib.util.os.makedirs", autospec=True)
+    @patch("lib.util.os.path.getsize", autospec=True)
+    @patch("lib.util.os.path.isfile", autospec=True)
+    def test_changed(self, isfile, getsize, makedirs, rename):
+        isfile.return_value = True
+        getsize.return_value = 4
+        # Call
+        ntools.assert_true(write_file("File_Path", "Text"))
+        # Tests
+        builtins.open.assert_called_with("File_Path.new", 'w')
+        rename.assert_called_once_with("File_Path.new", "File_Path")
+
+
+class TestLinkFile(object):
+    """
+    Unit tests for lib.util.link_file
+    """
+    @patch("lib.util.os.rename", autospec=True)
+    @patch("lib.util.shutil.copy", autospec=True)
+    @patch("lib.util.os.link", autospec=True)
+    @patch("lib.util.os.path.lexists", autospec=True)
+    @patch("lib.util.os.path.exists", autospec=True)
+    def test_link(self, exists, lexists, link, copy, rename):
+        exists.return_value = False
+        lexists.return_value = False
+        # Call
+        link_file("Src", "Dst")
+        # Tests
+        link.assert_called_once_with("Src", "Dst.new")
+        ntools.assert_false(copy.called)
+        rename.assert_called_once_with("Dst.new", "Dst")
+
+    @patch("lib.util.os.rename", autospec=True)
+    @patch("lib.util.shutil.copy", autospec=True)
+    @patch("lib.util.os.link", autospec=True)
+    @patch("lib.util.os.path.lexists", autospec=True)
+    @patch("lib.util.os.path.exists", autospec=True)
+    def test_copy_fallback(self, exists, lexists, link, copy, rename):
+        exists.return_value = False
+        lexists.return_value = False
+        link.side_effect = PermissionError
+        # Call
+        link_file("Src", "Dst")
+        # Tests
+        copy.assert_called_once_with("Src", "Dst.new")
+        rename.assert_called_once_with("Dst.new", "Dst")
+
+    @patch("lib.util.shutil.copy", autospec=True)
+    @patch("lib.util.os.link", autospec=True)
+    @patch("lib.util.os.path.lexists", autospec=True)
+    @patch("lib.util.os.path.exists", autospec=True)
+    def test_error(self, exists, lexists, link, copy):
+        exists.return_value = False
+        lexists.return_value = False
+        link.side_effect = PermissionError
+        copy.side_effect = FileNotFoundError
+        # Call
+        ntools.assert_raises(SCIONIOError, link_file, "Src", "Dst")
+
+
+class TestSymlinkFile(object):
+    """
+    Unit tests for lib.util.symlink_file
+    """
+    @patch("lib.util.os.rename", autospec=True)
+    @patch("lib.util.os.symlink", autospec=True)
+    @patch("lib.util.os.path.lexists", autospec=True)
+    @patch("lib.util.os.path.islink", autospec=True)
+    def test_link(self, islink, lexists, symlink, rename):
+        islink.return_value = False
+        lexists.return_value = False
+        # Call
+        symlink_file("Dir/Src", "Elem/Dst")
+        # Tests
+        symlink.assert_called_once_with("../Dir/Src", "Elem/Dst.new")
+        rename.assert_called_once_with("Elem/Dst.new", "Elem/Dst")
+
+    @patch("lib.util.os.rename", autospec=True)
+    @patch("lib.util.os.symlink", autospec=True)
+    @patch("lib.util.os.readlink", autospec=True)
+    @patch("lib.util.os.path.islink", autospec=True)
+    def test_up_to_date(self, islink, readlink, symlink, rename):
+        islink.return_value = True
+        readlink.return_value = "../Dir/Src"
+        # Call
+        symlink_file("Dir/Src", "Elem/Dst")
+        # Tests
+        ntools.assert_false(symlink.called)
+        ntools.assert_false(rename.called)
+
+    @patch("lib.util.os.symlink", autospec=True)
+    @patch("lib.util.os.path.lexists", autospec=True)
+    @patch("lib.util.os.path.islink", autospec=True)
+    def test_error(self, islink, lexists, symlink):
+        islink.return_value = False
+        lexists.return_value = False
+        symlink.side_effect = PermissionError
+        # Call
+        ntools.assert_raises(SCIONIOError, symlink_file, "Dir/Src", "Elem/Dst")
+
 
 class Loader(object):
     """
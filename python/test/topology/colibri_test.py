@@ -0,0 +1,108 @@
+# Copyright 2020 Anapaya Systems
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+:mod:`topology_colibri_test` --- topology.colibri unit tests
+============================================================
+"""
+# External packages
+import nose
+import nose.tools as ntools
+
+# SCION
+from topology.colibri import ColibriPlanner, LOCAL_BW, LOCAL_IFID
+from topology.common import TopoID
+from topology.links import LinkGraph
+
+
+_CORES = ("1-ff00:0:110", "1-ff00:0:120", "1-ff00:0:130")
+# a, b, type of b as seen from a, bandwidth.
+_LINKS = (
+    ("1-ff00:0:110", "1-ff00:0:120", "CORE", 1000),
+    ("1-ff00:0:110", "1-ff00:0:130", "CORE", 400),
+    ("1-ff00:0:120", "1-ff00:0:130", "CORE", 1000),
+    ("1-ff00:0:110", "1-ff00:0:111", "CHILD", 1000),
+    ("1-ff00:0:120", "1-ff00:0:111", "CHILD", 200),
+    ("1-ff00:0:130", "1-ff00:0:112", "CHILD", 1000),
+    ("1-ff00:0:111", "1-ff00:0:113", "CHILD", 1000),
+    ("1-ff00:0:112", "1-ff00:0:113", "CHILD", 300),
+)
+_REMOTE_TYPES = {"CORE": "CORE", "CHILD": "PARENT"}
+
+
+def _planner(**kwargs):
+    links = LinkGraph()
+    topo_dicts = {}
+    ifids = {}
+    for a, b, b_type, bw in _LINKS:
+        a, b = TopoID(a), TopoID(b)
+        for topo_id in (a, b):
+            attrs = ["core"] if str(topo_id) in _CORES else []
+            topo_dicts[topo_id] = {"Attributes": attrs, "ColibriService": {"co-1": {}}}
+            ifids[topo_id] = ifids.get(topo_id, 0) + 1
+        links.add(a, b, b_type, _REMOTE_TYPES[b_type], b_type, {"bw": bw},
+                  "br%s" % a.file_fmt(), "br%s" % b.file_fmt(), ifids[a], ifids[b])
+    return ColibriPlanner(topo_dicts, links, **kwargs), topo_dicts
+
+
+class TestPlanAS(object):
+    """
+    Unit tests for topology.colibri.ColibriPlanner._plan_as
+    """
+    def _dsts(self, planner):
+        return {str(topo_id): sorted(str(rsvp.dst) for rsvp in rsvps)
+                for topo_id, rsvps in planner.rsvps.items() if planner.is_core(topo_id)}
+
+    def test_all_cores(self):
+        planner, _ = _planner()
+        ntools.eq_(self._dsts(planner), {
+            "1-ff00:0:110": ["1-ff00:0:120", "1-ff00:0:130"],
+            "1-ff00:0:120": ["1-ff00:0:110", "1-ff00:0:130"],
+            "1-ff00:0:130": ["1-ff00:0:110", "1-ff00:0:120"],
+        })
+
+    def test_nearest_cores(self):
+        planner, _ = _planner(core_rsvps=1)
+        ntools.eq_(self._dsts(planner), {
+            "1-ff00:0:110": ["1-ff00:0:120"],
+            "1-ff00:0:120": ["1-ff00:0:110"],
+            "1-ff00:0:130": ["1-ff00:0:110"],
+        })
+
+
+class TestTrafficMatrix(object):
+    """
+    Unit tests for topology.colibri.ColibriPlanner.traffic_matrix
+    """
+    def _check_sums(self, planner, topo_id):
+        bws = {LOCAL_IFID: LOCAL_BW}
+        for end in planner.links.ends(topo_id):
+            bws[end.ifid] = end.attrs["bw"]
+        matrix = planner.traffic_matrix(topo_id)
+        ntools.eq_(set(matrix), set(bws))
+        for in_ifid, row in matrix.items():
+            ntools.assert_less_equal(sum(row.values()), bws[in_ifid], (topo_id, in_ifid))
+        for eg_ifid, bw in bws.items():
+            col = sum(row.get(eg_ifid, 0) for row in matrix.values())
+            ntools.assert_less_equal(col, bw, (topo_id, eg_ifid))
+
+    def test_sums(self):
+        for demand in (None, 50):
+            planner, topo_dicts = _planner(demand=demand)
+            ntools.assert_true(any(planner.loads.values()))
+            for topo_id in topo_dicts:
+                self._check_sums(planner, topo_id)
+
+
+if __name__ == "__main__":
+    nose.run(defaultTest=__name__)
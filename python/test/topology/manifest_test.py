@@ -0,0 +1,109 @@
+# Copyright 2020 Anapaya Systems
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+:mod:`topology_manifest_test` --- topology.manifest unit tests
+==============================================================
+"""
+# Stdlib
+import os
+import shutil
+import tempfile
+
+# External packages
+import nose
+import nose.tools as ntools
+
+# SCION
+from lib.defines import GEN_MANIFEST_FILE
+from topology.common import TopoID
+from topology.manifest import GenManifest
+
+_FULL = {
+    "1-ff00:0:110": ["br1-ff00_0_110-1", "br1-ff00_0_110-2", "cs1-ff00_0_110-1"],
+    "1-ff00:0:111": ["br1-ff00_0_111-1", "cs1-ff00_0_111-1"],
+}
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(data)
+
+
+def _generate(out_dir, ases):
+    """
+    Mimic a generator run: render the changed ASes, then copy the crypto material of every AS
+    into the dirs of its elements, as the cert generator does.
+    """
+    manifest = GenManifest(out_dir, {})
+    for ia, elems in sorted(ases.items()):
+        topo_id = TopoID(ia)
+        manifest.check_as(topo_id, {"Elems": elems})
+        if manifest.is_unchanged(topo_id):
+            continue
+        base = topo_id.base_dir(out_dir)
+        for elem in elems:
+            _write(os.path.join(base, elem, "topology.json"), "%s %s" % (elems, elem))
+        _write(os.path.join(base, "supervisord.conf"), str(elems))
+    for ia, elems in ases.items():
+        base = TopoID(ia).base_dir(out_dir)
+        for dir_ in [base] + [os.path.join(base, elem) for elem in elems]:
+            _write(os.path.join(dir_, "keys", "master0.key"), ia)
+            _write(os.path.join(dir_, "certs", "as.crt"), ia)
+    manifest.write()
+
+
+def _tree(out_dir):
+    tree = {}
+    for dir_, _, names in os.walk(out_dir):
+        rel = os.path.relpath(dir_, out_dir)
+        tree[rel] = set()
+        for name in names:
+            if name == GEN_MANIFEST_FILE:
+                continue
+            with open(os.path.join(dir_, name)) as f:
+                tree[rel].add((name, f.read()))
+    return tree
+
+
+class TestGenManifestIncremental(object):
+    """
+    Unit tests for the incremental regeneration with topology.manifest.GenManifest
+    """
+    def _check(self, ases):
+        tmp = tempfile.mkdtemp()
+        try:
+            incremental = os.path.join(tmp, "incremental")
+            clean = os.path.join(tmp, "clean")
+            _generate(incremental, _FULL)
+            _generate(incremental, ases)
+            _generate(clean, ases)
+            ntools.eq_(_tree(incremental), _tree(clean))
+        finally:
+            shutil.rmtree(tmp)
+
+    def test_drop_elem(self):
+        ases = dict(_FULL)
+        ases["1-ff00:0:110"] = ["br1-ff00_0_110-1", "cs1-ff00_0_110-1"]
+        self._check(ases)
+
+    def test_drop_as(self):
+        self._check({"1-ff00:0:110": _FULL["1-ff00:0:110"]})
+
+    def test_unchanged(self):
+        self._check(_FULL)
+
+
+if __name__ == "__main__":
+    nose.run(defaultTest=__name__)
@@ -0,0 +1,87 @@
+# Copyright 2020 Anapaya Systems
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+:mod:`topology_prometheus_test` --- topology.prometheus unit tests
+==================================================================
+"""
+# Stdlib
+import re
+from types import SimpleNamespace
+
+# External packages
+import nose
+import nose.tools as ntools
+
+# SCION
+from topology.common import TopoID
+from topology.prometheus import PrometheusGenerator
+
+# A PromQL instant vector selector: metric{label op "string", ...}[range].
+_SELECTOR_RE = re.compile(r'(\w+)\{([^}]*)\}\[\w+\]')
+# A label matcher, with a Go style double-quoted string.
+_MATCHER_RE = re.compile(r'(\w+)(=|!=|=~|!~)"((?:[^"\\]|\\.)*)"(?:,|$)')
+# The escapes Go allows in a double-quoted string, besides numeric ones.
+_GO_ESCAPE_RE = re.compile(r'\\[abfnrtv\\"]')
+
+
+def _parse_matchers(raw):
+    matchers = []
+    pos = 0
+    while pos < len(raw):
+        m = _MATCHER_RE.match(raw, pos)
+        ntools.assert_is_not_none(m, "Invalid label matcher at %d in %s" % (pos, raw))
+        ntools.eq_(_GO_ESCAPE_RE.sub('', m.group(3)).count('\\'), 0,
+                   "Invalid escape in %s" % m.group(3))
+        if m.group(2) in ('=~', '!~'):
+            re.compile(m.group(3))
+        matchers.append(m.groups())
+        pos = m.end()
+    return matchers
+
+
+class TestAddLinkRules(object):
+    """
+    Unit tests for topology.prometheus.PrometheusGenerator._add_link_rules
+    """
+    def _rules(self):
+        topo_id = TopoID("1-ff00:0:110")
+        as_topo = {"BorderRouters": {
+            "br1-ff00_0_110-1": {"Interfaces": {1: {"LinkTo": "CORE"}, 3: {"LinkTo": "CHILD"}}},
+            "br1-ff00_0_110-2": {"Interfaces": {2: {"LinkTo": "CORE"}}},
+        }}
+        gen = PrometheusGenerator(SimpleNamespace())
+        gen._add_link_rules(topo_id, as_topo)
+        return gen.link_rules
+
+    def test_exprs_parse(self):
+        rules = self._rules()
+        ntools.eq_(len(rules), 6)
+        for rule in rules:
+            selectors = _SELECTOR_RE.findall(rule['expr'])
+            ntools.eq_(len(selectors), 1, rule['expr'])
+            matchers = _parse_matchers(selectors[0][1])
+            ntools.assert_in(('job', '=', 'BR'), matchers)
+            ntools.assert_in(('isd_as', '=', '1-ff00:0:110'), matchers)
+
+    def test_intfs(self):
+        intfs = {}
+        for rule in self._rules():
+            if rule['record'].startswith('isd_as_link_to:br_input_bytes'):
+                matchers = _parse_matchers(_SELECTOR_RE.search(rule['expr']).group(2))
+                intfs[rule['labels']['link_to']] = [v for k, _, v in matchers if k == 'intf'][0]
+        ntools.eq_(intfs, {'CORE': '1|2', 'CHILD': '3'})
+
+
+if __name__ == "__main__":
+    nose.run(defaultTest=__name__)
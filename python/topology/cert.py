@@ -17,12 +17,51 @@
 =============================================
 """
 import base64
+import glob
+import hashlib
+import hmac
+import json
+import logging
 import os
+import shutil
+import time
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
 from plumbum import local
 
-from topology.common import ArgsTopoConfig, srv_iter
+from lib.util import link_file
+from topology.common import ArgsTopoConfig, srv_iter, TopoID
+
+# The scion-pki stages that are run for every ISD, in order.
+PKI_STAGES = (
+    ('keys', 'private'),
+    ('keys', 'master'),
+    ('trcs', 'gen'),
+    ('certs', 'issuer'),
+    ('certs', 'chain'),
+)
+
+# The directories scion-pki generates crypto material in.
+ISD_CRYPTO_DIRS = ('trcs',)
+AS_CRYPTO_DIRS = ('certs', 'keys', 'pub')
+# The templates scion-pki generates the crypto material from.
+ISD_CRYPTO_TMPLS = ('trc-v*.toml',)
+AS_CRYPTO_TMPLS = ('keys.toml', 'issuer-v*.toml', 'as-v*.toml')
+
+SCION_PKI = './bin/scion-pki'
+# The validity of the generated crypto material, in days.
+PKI_VALIDITY_DAYS = 365
+# Cached crypto material that expires within this many seconds is generated anew.
+CACHE_MIN_VALIDITY = 7 * 24 * 3600
+# The file of a crypto cache entry that records when its material expires.
+CACHE_META_FILE = 'meta.json'
+
+# Length of the AS master keys, in bytes.
+MASTER_KEY_LEN = 16
+
+# The AS attributes that determine the crypto material of an ISD.
+CRYPTO_ATTRS = ('authoritative', 'core', 'issuing', 'voting', 'cert_issuer')
 
 
 class CertGenArgs(ArgsTopoConfig):
@@ -36,42 +75,236 @@ class CertGenerator(object):
         arguments and the parsed topo config.
         """
         self.args = args
-        self.pki = local['./bin/scion-pki']
+        self.pki = local[SCION_PKI]
         self.core_count = defaultdict(int)
+        self.cache = None
+        self._trcs = None
+        if self.args.crypto_cache:
+            self.cache = CryptoCache(self.args.crypto_cache, self.args.output_dir,
+                                     self.args.seed, _file_digest(SCION_PKI))
 
     def generate(self, topo_dicts):
-        self.pki('tmpl', 'topo', self.args.topo_config, '-d', self.args.output_dir)
-        self.pki('keys', 'private', '*', '-d', self.args.output_dir)
-        self.pki('keys', 'master', '*', '-d', self.args.output_dir)
-        self.pki('trcs', 'gen', '*', '-d', self.args.output_dir)
-        self.pki('certs', 'issuer', '*', '-d', self.args.output_dir)
-        self.pki('certs', 'chain', '*', '-d', self.args.output_dir)
-        self._master_keys(topo_dicts)
-        self._copy_files(topo_dicts)
-
-    def _master_keys(self, topo_dicts):
-        for topo_id, as_topo in topo_dicts.items():
+        self.generate_isds(topo_dicts)
+        self.copy_files(topo_dicts)
+
+    def generate_isds(self, topo_ids):
+        """
+        Generate the crypto material of every ISD and AS, in the ISD and AS directories.
+
+        :param topo_ids: iterable of the TopoIDs of all ASes.
+        """
+        not_before = int(time.time())
+        self.pki('tmpl', 'topo', self.args.topo_config, '-d', self.args.output_dir,
+                 '--notbefore', not_before, '--validity', '%dd' % PKI_VALIDITY_DAYS)
+        isds = self._isds()
+        cached = set()
+        if self.cache:
+            cached = {isd for isd, ases in isds.items()
+                      if self.cache.restore(isd, ases, not_before)}
+            if cached:
+                logging.info("Reusing cached crypto material for ISDs: %s",
+                             ", ".join(sorted(cached, key=int)))
+        stale = {isd: ases for isd, ases in isds.items() if isd not in cached}
+        self._run_pki_stages(stale, all_isds=not cached)
+        self._master_keys(topo_ids, cached)
+        if self.cache:
+            for isd, ases in stale.items():
+                self.cache.store(isd, ases, not_before + PKI_VALIDITY_DAYS * 24 * 3600)
+
+    def _isds(self):
+        """
+        :returns: a dict mapping every ISD to the configs of its ASes, keyed by TopoID.
+        """
+        isds = defaultdict(dict)
+        for isd_as, as_conf in self.args.config["ASes"].items():
+            topo_id = TopoID(isd_as)
+            isds[topo_id.isd_str()][topo_id] = as_conf
+        return isds
+
+    def _run_pki_stages(self, isds, all_isds=True):
+        """
+        Run the scion-pki stages. The ISDs do not depend on each other, so with more than one job
+        every ISD runs through the stages in its own thread.
+        """
+        if not isds:
+            return
+        if self.args.jobs == 1 and all_isds:
+            self._run_isd_pki_stages('*')
+            return
+        with ThreadPoolExecutor(max_workers=self.args.jobs or None) as executor:
+            for f in [executor.submit(self._run_isd_pki_stages, isd)
+                      for isd in sorted(isds, key=int)]:
+                f.result()
+
+    def _run_isd_pki_stages(self, selector):
+        for stage in PKI_STAGES:
+            self.pki(*stage, selector, '-d', self.args.output_dir)
+
+    def _master_keys(self, topo_ids, cached_isds=()):
+        for topo_id in topo_ids:
+            if topo_id.isd_str() in cached_isds:
+                continue
             base = topo_id.base_dir(self.args.output_dir)
-            with open(os.path.join(base, 'keys', 'master0.key'), 'w') as f:
-                f.write(base64.b64encode(os.urandom(16)).decode())
-            with open(os.path.join(base, 'keys', 'master1.key'), 'w') as f:
-                f.write(base64.b64encode(os.urandom(16)).decode())
-
-    def _copy_files(self, topo_dicts):
-        cp = local['cp']
-        # Copy the certs and key dir for all elements.
+            for name in ('master0', 'master1'):
+                with open(os.path.join(base, 'keys', '%s.key' % name), 'w') as f:
+                    f.write(base64.b64encode(self._master_key(topo_id, name)).decode())
+
+    def _master_key(self, topo_id, name):
+        if self.args.seed is None:
+            return os.urandom(MASTER_KEY_LEN)
+        # Test mode: derive the key from the seed, independently of the order of the ASes.
+        label = ('%s %s' % (topo_id, name)).encode()
+        mac = hmac.new(str(self.args.seed).encode(), label, hashlib.sha256)
+        return mac.digest()[:MASTER_KEY_LEN]
+
+    def copy_files(self, topo_dicts):
+        """
+        Link the crypto material of the ASes into the directories of their elements.
+
+        :param dict topo_dicts: the topo dicts of the ASes to link the files for.
+        """
+        if self._trcs is None:
+            self._trcs = sorted(glob.glob(os.path.join(self.args.output_dir, '*', 'trcs',
+                                                       '*.trc')))
+        trcs = self._trcs
+        # Link the certs and key dir for all elements.
         for topo_id, as_topo, base in srv_iter(
                 topo_dicts, self.args.output_dir, common=True):
-            elem_dir = local.path(base)
-            as_dir = elem_dir.dirname
-            cp('-r', as_dir / 'certs', elem_dir / 'certs')
-            cp('-r', as_dir / 'keys', elem_dir / 'keys')
-            cp(as_dir.dirname.dirname // '*/trcs/*.trc', elem_dir / 'certs')
-        # Copy the customers dir for all certificate servers.
+            as_dir = os.path.dirname(base)
+            _mirror_tree(os.path.join(as_dir, 'certs'), os.path.join(base, 'certs'), link_file)
+            _mirror_tree(os.path.join(as_dir, 'keys'), os.path.join(base, 'keys'), link_file)
+            for trc in trcs:
+                link_file(trc, os.path.join(base, 'certs', os.path.basename(trc)))
+        # Link the customers dir for all certificate servers.
         for topo_id, as_topo in topo_dicts.items():
-            as_dir = local.path(topo_id.base_dir(self.args.output_dir))
-            custom_dir = as_dir / 'customers'
-            if not custom_dir.exists():
+            as_dir = topo_id.base_dir(self.args.output_dir)
+            custom_dir = os.path.join(as_dir, 'customers')
+            if not os.path.exists(custom_dir):
                 continue
             for elem in as_topo["ControlService"]:
-                cp('-r', as_dir / 'customers', as_dir / elem / 'customers')
+                _mirror_tree(custom_dir, os.path.join(as_dir, elem, 'customers'), link_file)
+
+
+class CryptoCache(object):
+    """
+    Cache of the crypto material generated by scion-pki (and the master keys), per ISD.
+
+    The material of an ISD is only reused if none of its ASes changed their role, i.e. their
+    core, voting, issuing, authoritative and cert_issuer attributes, as any such change affects
+    the TRC and the certificates of the ISD, and if it was generated with the same seed, as the
+    seed determines the master keys, and by the same scion-pki. Material that is about to expire
+    is not reused. The templates the material was generated from are cached and restored with
+    it, so that they match the restored material. Cached files are always copied, never linked,
+    as scion-pki may rewrite the generated files in place.
+    """
+
+    def __init__(self, cache_dir, out_dir, seed=None, pki_digest=None):
+        """
+        :param str cache_dir: the directory to keep the cached material in.
+        :param str out_dir: the output directory of the generator.
+        :param int seed: the seed the master keys are derived from, None if they are random.
+        :param str pki_digest: the digest of the scion-pki binary.
+        """
+        self.cache_dir = cache_dir
+        self.out_dir = out_dir
+        self.seed = seed
+        self.pki_digest = pki_digest
+
+    def restore(self, isd, ases, now):
+        """
+        Copy the cached material of the ISD to the output directory, if available and valid for
+        at least CACHE_MIN_VALIDITY.
+
+        :param str isd: the ISD.
+        :param dict ases: the configs of the ASes of the ISD, keyed by TopoID.
+        :param int now: the current time, in seconds since the epoch.
+        :returns: whether the material was restored.
+        """
+        entry = self._entry(isd, ases)
+        if not os.path.isdir(entry):
+            return False
+        if self._not_after(entry) < now + CACHE_MIN_VALIDITY:
+            logging.info("Cached crypto material of ISD %s expires, regenerating it", isd)
+            shutil.rmtree(entry)
+            return False
+        self._copy_crypto_dirs(entry, self.out_dir, isd, ases)
+        return True
+
+    def store(self, isd, ases, not_after):
+        """
+        Copy the generated material of the ISD into the cache.
+
+        :param str isd: the ISD.
+        :param dict ases: the configs of the ASes of the ISD, keyed by TopoID.
+        :param int not_after: the expiry of the material, in seconds since the epoch.
+        """
+        entry = self._entry(isd, ases)
+        if os.path.isdir(entry):
+            return
+        tmp_entry = entry + ".new"
+        shutil.rmtree(tmp_entry, ignore_errors=True)
+        self._copy_crypto_dirs(self.out_dir, tmp_entry, isd, ases)
+        with open(os.path.join(tmp_entry, CACHE_META_FILE), 'w') as f:
+            json.dump({'NotAfter': not_after}, f)
+        os.rename(tmp_entry, entry)
+
+    def _not_after(self, entry):
+        try:
+            with open(os.path.join(entry, CACHE_META_FILE)) as f:
+                return json.load(f)['NotAfter']
+        except (OSError, ValueError, KeyError):
+            # Entries without a known expiry are treated as expired.
+            return 0
+
+    def _entry(self, isd, ases):
+        roles = []
+        for topo_id, as_conf in sorted(ases.items()):
+            roles.append([str(topo_id)] + [as_conf.get(attr) for attr in CRYPTO_ATTRS])
+        key = [self.seed, self.pki_digest, PKI_VALIDITY_DAYS, roles]
+        digest = hashlib.sha1(json.dumps(key).encode()).hexdigest()
+        return os.path.join(self.cache_dir, "ISD%s" % isd, digest)
+
+    def _copy_crypto_dirs(self, src, dst, isd, ases):
+        isd_dir = "ISD%s" % isd
+        for name in ISD_CRYPTO_DIRS:
+            _mirror_tree(os.path.join(src, isd_dir, name), os.path.join(dst, isd_dir, name),
+                         shutil.copy)
+        _copy_matching(os.path.join(src, isd_dir), os.path.join(dst, isd_dir), ISD_CRYPTO_TMPLS)
+        for topo_id in ases:
+            as_dir = topo_id.base_dir('')
+            for name in AS_CRYPTO_DIRS:
+                _mirror_tree(os.path.join(src, as_dir, name), os.path.join(dst, as_dir, name),
+                             shutil.copy)
+            _copy_matching(os.path.join(src, as_dir), os.path.join(dst, as_dir), AS_CRYPTO_TMPLS)
+
+
+def _mirror_tree(src, dst, copy_func):
+    """
+    Mirror the files below src into dst, using copy_func(src_file, dst_file) for every file.
+    """
+    for dir_, _, names in os.walk(src):
+        dst_dir = os.path.join(dst, os.path.relpath(dir_, src))
+        os.makedirs(dst_dir, exist_ok=True)
+        for name in names:
+            copy_func(os.path.join(dir_, name), os.path.join(dst_dir, name))
+
+
+def _copy_matching(src, dst, patterns):
+    """
+    Copy the files in src that match any of the glob patterns into dst.
+    """
+    os.makedirs(dst, exist_ok=True)
+    for pattern in patterns:
+        for path in glob.glob(os.path.join(src, pattern)):
+            shutil.copy(path, os.path.join(dst, os.path.basename(path)))
+
+
+def _file_digest(path):
+    """
+    :returns: the SHA-1 digest of the file at path, or None if it can not be read.
+    """
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    except OSError:
+        return None
@@ -0,0 +1,514 @@
+# Copyright 2020 Anapaya Systems
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+:mod:`colibri` --- SCION topology colibri provisioning
+======================================================
+"""
+# Stdlib
+import heapq
+import math
+from collections import Counter, defaultdict, deque
+
+# SCION
+from lib.types import LinkType
+from topology.topo import DEFAULT_LINK_BW
+
+MATRIX_DENSE = 'dense'
+MATRIX_COMPRESSED = 'compressed'
+MATRIX_FORMATS = (MATRIX_DENSE, MATRIX_COMPRESSED)
+
+# The interface ID of the AS itself, in the traffic matrices.
+LOCAL_IFID = 0
+# The bandwidth of the AS itself, as an interface, in kbps.
+LOCAL_BW = DEFAULT_LINK_BW
+# The largest colibri bandwidth class, see go/lib/colibri/reservation.BWCls.
+MAX_BW_CLS = 63
+# The share of the link bandwidth the reservations are planned into, leaving the rest for the
+# traffic without reservations.
+DEFAULT_UTILIZATION = 0.8
+# The tolerance of the planned bandwidths when rounding them down to kbps.
+BW_ROUNDING = 1e-6
+# The number of core ASes every core AS reserves towards, the nearest ones first. Reserving
+# towards all core ASes grows with the square of their number, and with the length of the paths.
+DEFAULT_CORE_RSVPS = 16
+# The traffic split class of the reservations, see go/lib/colibri/reservation.SplitCls.
+DEFAULT_SPLIT_CLS = 8
+# The number of rounds of fitting the bandwidth left on the interfaces into a traffic matrix.
+MATRIX_FIT_ROUNDS = 10
+
+# The links a reservation of the given path type follows, as the type of the next AS seen from
+# the current AS. Up reservations are planned from the reserving AS to the core AS, down
+# reservations from the core AS to the reserving AS.
+PATH_LINK_TYPES = {
+    'Up': LinkType.PARENT,
+    'Down': LinkType.CHILD,
+    'Core': LinkType.CORE,
+}
+
+
+def bw_cls(kbps):
+    """
+    :param int kbps: a bandwidth in kbps.
+    :returns: the largest colibri bandwidth class, 16 * sqrt(2^(cls - 1)) kbps, that does not
+        exceed the bandwidth.
+    """
+    if kbps < 16:
+        return 0
+    cls = min(MAX_BW_CLS, 1 + int(2 * math.log2(kbps / 16)))
+    while cls > 0 and cls_kbps(cls) > kbps:
+        cls -= 1
+    return cls
+
+
+def cls_kbps(cls):
+    """
+    :returns: the bandwidth of the colibri bandwidth class cls, in kbps.
+    """
+    if cls == 0:
+        return 0
+    return 16 * math.sqrt(2 ** (cls - 1))
+
+
+class Reservation(object):
+    """
+    A planned segment reservation of the colibri service in src towards the core AS dst.
+    """
+    __slots__ = ('src', 'dst', 'path_type', 'path', 'max_bw', 'demand', 'bw')
+
+    def __init__(self, src, dst, path_type):
+        self.src = src
+        self.dst = dst
+        self.path_type = path_type
+        # The LinkEnds the reservation traverses, each as seen from the sending AS.
+        self.path = []
+        # The max-flow between the ends of the reservation, in kbps.
+        self.max_bw = 0
+        # The bandwidth the reservation asks for, and the bandwidth allocated to it, in kbps.
+        self.demand = 0
+        self.bw = 0
+
+    def name(self):
+        return '%s-%s' % (self.path_type, self.dst)
+
+    def origin(self):
+        """
+        :returns: the AS the traffic of the reservation enters the path at.
+        """
+        return self.dst if self.path_type == 'Down' else self.src
+
+
+class ColibriPlanner(object):
+    """
+    Plans the reservations and the traffic matrices of the colibri services of all ASes.
+
+    The core ASes of every ISD are collected once, so that the reservations of an AS only visit
+    the core ASes it reserves towards. Every reservation follows the shortest path of its path
+    type, and the link bandwidth is shared max-min fairly among the reservations on the link: the
+    allocations grow evenly until either the planned share of a link is used up, or a reservation
+    gets its demand. The ASes at the ends of the reservations are shared the same way, as an
+    interface with LOCAL_BW. The maximum size of a reservation is the max-flow between its ends.
+    Core ASes only reserve towards the nearest core_rsvps core ASes.
+    """
+
+    def __init__(self, topo_dicts, links, matrix_format=MATRIX_DENSE, demand=None,
+                 utilization=DEFAULT_UTILIZATION, core_rsvps=DEFAULT_CORE_RSVPS):
+        """
+        :param dict topo_dicts: The generated topo dicts from TopoGenerator.
+        :param LinkGraph links: The links of the topology.
+        :param str matrix_format: one of MATRIX_FORMATS.
+        :param int demand: The bandwidth every reservation asks for, in kbps. If None, the
+            reservations ask for as much as their links allow.
+        :param float utilization: The share of the bandwidth of every link the reservations are
+            planned into.
+        :param int core_rsvps: The number of core ASes every core AS reserves towards.
+        """
+        self.links = links
+        self.matrix_format = matrix_format
+        self.demand = demand
+        self.utilization = utilization
+        self.core_rsvps = core_rsvps
+        self.cores = defaultdict(list)
+        for topo_id, topo in topo_dicts.items():
+            if 'core' in topo['Attributes']:
+                self.cores[topo_id.isd_str()].append(topo_id)
+        # The shortest path trees by source AS and link type.
+        self._trees = {}
+        # The bandwidth between every AS and its remote ASes by link type, see _capacities.
+        self._caps = {}
+        # The max-flows between the core ASes by source AS, and between the non-core ASes and
+        # the core ASes of their ISD.
+        self._core_flows = self._core_flow_tree()
+        self._flows = {}
+        # The planned reservations by reserving AS.
+        self.rsvps = defaultdict(list)
+        # The planned bandwidth between every ingress and egress, by AS.
+        self.loads = defaultdict(Counter)
+        for topo_id, topo in topo_dicts.items():
+            if topo.get('ColibriService'):
+                self.rsvps[topo_id] = self._plan_as(topo_id)
+        self._allocate([r for rsvps in self.rsvps.values() for r in rsvps])
+
+    def is_core(self, topo_id):
+        return topo_id in self.cores.get(topo_id.isd_str(), ())
+
+    def _plan_as(self, topo_id):
+        """
+        :returns: one reservation per core AS among the core_rsvps nearest ones (if topo_id is
+            core) excluding itself, or a pair (up and down) per core AS in the ISD if topo_id is
+            not core, that can be reached.
+        """
+        if self.is_core(topo_id):
+            # The shortest path tree lists the ASes by their distance.
+            nearest = [dst_ia for dst_ia in self._tree(topo_id, LinkType.CORE)
+                       if dst_ia != topo_id and self.is_core(dst_ia)]
+            nearest = set(nearest[:self.core_rsvps])
+            rsvps = [Reservation(topo_id, dst_ia, 'Core') for cores in self.cores.values()
+                     for dst_ia in cores if dst_ia in nearest]
+        else:
+            # reach the core ASes in the same ISD
+            rsvps = [Reservation(topo_id, dst_ia, path_type)
+                     for dst_ia in self.cores.get(topo_id.isd_str(), ())
+                     for path_type in ('Up', 'Down')]
+        planned = []
+        for rsvp in rsvps:
+            src, dst = rsvp.src, rsvp.dst
+            if rsvp.path_type == 'Down':
+                src, dst = dst, src
+            rsvp.path = self._shortest_path(src, dst, PATH_LINK_TYPES[rsvp.path_type])
+            if rsvp.path is None:
+                # e.g. a core AS that is not above the reserving AS.
+                continue
+            rsvp.max_bw = self._rsvp_max_flow(rsvp)
+            rsvp.demand = rsvp.max_bw if self.demand is None else min(self.demand, rsvp.max_bw)
+            planned.append(rsvp)
+        return planned
+
+    def _tree(self, src, link_type):
+        """
+        :returns: the shortest path tree from src over the links of the given type, as a dict
+            mapping every reachable AS to the LinkEnd it is reached over and the previous AS.
+        """
+        key = (src, link_type)
+        if key in self._trees:
+            return self._trees[key]
+        prev = {src: None}
+        queue = deque([src])
+        while queue:
+            topo_id = queue.popleft()
+            for end in self.links.ends(topo_id, link_type):
+                if end.remote not in prev:
+                    prev[end.remote] = (end, topo_id)
+                    queue.append(end.remote)
+        self._trees[key] = prev
+        return prev
+
+    def _shortest_path(self, src, dst, link_type):
+        """
+        :returns: the LinkEnds of a path with the fewest links from src to dst, or None.
+        """
+        prev = self._tree(src, link_type)
+        if dst not in prev:
+            return None
+        path = []
+        while prev[dst] is not None:
+            end, dst = prev[dst]
+            path.append(end)
+        return path[::-1]
+
+    def _rsvp_max_flow(self, rsvp):
+        if rsvp.path_type == 'Core':
+            return self._core_flows[rsvp.src][rsvp.dst]
+        # The links are symmetric, so the down flow from a core AS equals the up flow to it.
+        key = (rsvp.src, rsvp.dst)
+        if key not in self._flows:
+            self._flows[key] = self._max_flow(rsvp.src, rsvp.dst, LinkType.PARENT)[0]
+        return self._flows[key]
+
+    def _core_flow_tree(self):
+        """
+        Computes the max-flows between all core ASes with Gusfield's equivalent flow tree: the
+        max-flow between two core ASes is the smallest flow on the tree path between them, so
+        that n - 1 max-flows cover all pairs of the n core ASes.
+
+        :returns: dict mapping every core AS to the max-flows from it to the other core ASes.
+        """
+        nodes = [topo_id for cores in self.cores.values() for topo_id in cores]
+        parent = [0] * len(nodes)
+        tree = defaultdict(list)
+        for s in range(1, len(nodes)):
+            t = parent[s]
+            flow, cut = self._max_flow(nodes[s], nodes[t], LinkType.CORE)
+            for i in range(s + 1, len(nodes)):
+                if parent[i] == t and nodes[i] in cut:
+                    parent[i] = s
+            tree[s].append((t, flow))
+            tree[t].append((s, flow))
+        flows = {}
+        for src in range(len(nodes)):
+            dst_flows = {src: None}
+            stack = [src]
+            while stack:
+                u = stack.pop()
+                for v, flow in tree[u]:
+                    if v not in dst_flows:
+                        prev = dst_flows[u]
+                        dst_flows[v] = flow if prev is None else min(prev, flow)
+                        stack.append(v)
+            flows[nodes[src]] = {nodes[v]: flow for v, flow in dst_flows.items() if v != src}
+        return flows
+
+    def _capacities(self, link_type):
+        """
+        :returns: dict mapping every AS to the bandwidth of the links of the given type to every
+            remote AS, in kbps.
+        """
+        if link_type not in self._caps:
+            caps = defaultdict(Counter)
+            for link in self.links:
+                if link.b_type.lower() == link_type:
+                    caps[link.a][link.b] += _link_bw(link)
+                if link.a_type.lower() == link_type:
+                    caps[link.b][link.a] += _link_bw(link)
+            self._caps[link_type] = caps
+        return self._caps[link_type]
+
+    def _max_flow(self, src, dst, link_type):
+        """
+        :returns: the max-flow from src to dst over the links of the given type in kbps, and the
+            ASes on the side of src of a minimum cut.
+        """
+        caps = self._capacities(link_type)
+        residual = defaultdict(Counter)
+        for topo_id in self._tree(src, link_type):
+            residual[topo_id].update(caps[topo_id])
+        flow = 0
+        while True:
+            # Edmonds-Karp: augment along the shortest path with residual capacity.
+            prev = {src: None}
+            queue = deque([src])
+            while queue and dst not in prev:
+                topo_id = queue.popleft()
+                for remote, cap in residual[topo_id].items():
+                    if cap > 0 and remote not in prev:
+                        prev[remote] = topo_id
+                        queue.append(remote)
+            if dst not in prev:
+                return flow, prev
+            hops = []
+            topo_id = dst
+            while prev[topo_id] is not None:
+                hops.append((prev[topo_id], topo_id))
+                topo_id = prev[topo_id]
+            aug = min(residual[a][b] for a, b in hops)
+            for a, b in hops:
+                residual[a][b] -= aug
+                residual[b][a] += aug
+            flow += aug
+
+    def _allocate(self, rsvps):
+        """
+        Share the planned share of the bandwidth of every link direction, and of the AS at either
+        end, max-min fairly among the reservations that traverse it, and record the resulting
+        load between the interfaces of every AS.
+        """
+        caps = {}
+        for link in self.links:
+            caps[(link.id, link.a_br)] = caps[(link.id, link.b_br)] = (
+                _link_bw(link) * self.utilization)
+        local_cap = LOCAL_BW * self.utilization
+        active = {i for i, rsvp in enumerate(rsvps) if rsvp.demand > 0}
+        # The active reservations on every link direction.
+        users = defaultdict(set)
+        rsvp_keys = []
+        for i, rsvp in enumerate(rsvps):
+            # The traffic leaves the AS it originates in, traverses the link directions, and
+            # enters the AS at the end of the path.
+            keys = [(rsvp.origin(), LOCAL_IFID)]
+            keys.extend((end.link.id, end.br) for end in rsvp.path)
+            keys.append((LOCAL_IFID, rsvp.path[-1].remote))
+            caps[keys[0]] = caps[keys[-1]] = local_cap
+            if i in active:
+                for key in keys:
+                    users[key].add(i)
+            rsvp_keys.append(keys)
+        # The bandwidth of the frozen reservations on every link direction, and the number of
+        # times it changed.
+        used = Counter()
+        changes = Counter()
+
+        # The heap orders equal saturation levels by the order of the keys, as the keys of the
+        # links and of the ASes do not compare.
+        order = {key: n for n, key in enumerate(users)}
+
+        def saturation(key):
+            return (caps[key] - used[key]) / len(users[key])
+
+        # All active reservations are allocated the same bandwidth, the level. It rises until a
+        # link direction is saturated or a reservation gets its demand, which freezes the
+        # reservations. The outdated saturation levels are skipped.
+        sats = [(saturation(key), order[key], key, 0) for key in users]
+        heapq.heapify(sats)
+        demands = deque(sorted((rsvps[i].demand, i) for i in active))
+        bws = [0] * len(rsvps)
+        while active:
+            while demands[0][1] not in active:
+                demands.popleft()
+            level = demands[0][0]
+            frozen = set()
+            while sats:
+                sat, _, key, change = sats[0]
+                if change != changes[key]:
+                    heapq.heappop(sats)
+                elif sat <= level:
+                    heapq.heappop(sats)
+                    level = sat
+                    frozen.update(users[key])
+                else:
+                    break
+            while demands and demands[0][0] <= level:
+                frozen.add(demands.popleft()[1])
+            changed = set()
+            for i in frozen & active:
+                active.remove(i)
+                bws[i] = level
+                for key in rsvp_keys[i]:
+                    users[key].discard(i)
+                    used[key] += level
+                    changed.add(key)
+            for key in changed:
+                changes[key] += 1
+                if users[key]:
+                    heapq.heappush(sats, (saturation(key), order[key], key, changes[key]))
+        for rsvp, bw in zip(rsvps, bws):
+            # Round down, but not the float error of the levels.
+            rsvp.bw = int(bw + BW_ROUNDING)
+            in_ifid = LOCAL_IFID
+            topo_id = rsvp.origin()
+            for end in rsvp.path:
+                self.loads[topo_id][(in_ifid, end.ifid)] += rsvp.bw
+                in_ifid, topo_id = end.remote_ifid, end.remote
+            self.loads[topo_id][(in_ifid, LOCAL_IFID)] += rsvp.bw
+
+    def traffic_matrix(self, topo_id):
+        """
+        Creates the traffic matrix of the AS, over its interfaces and the AS itself. Every entry
+        is the bandwidth planned for the reservations from the ingress to the egress, plus a share
+        of the bandwidth left on both. The bandwidth left on every ingress is split over the other
+        interfaces in proportion to the bandwidth left on them, i.e. evenly if all links have the
+        same bandwidth and no reservations are planned, and the shares are then fitted to the
+        bandwidth left on the egresses. The AS itself counts as an interface with LOCAL_BW. No
+        ingress nor egress is planned beyond its bandwidth.
+
+        In the dense format, the matrix maps every ingress to every egress to the bandwidth. In
+        the compressed format, every ingress maps to the most common bandwidth of its row as
+        'default', and the egresses with a different bandwidth as 'exceptions'.
+        """
+        bws = {LOCAL_IFID: LOCAL_BW}
+        for end in self.links.ends(topo_id):
+            bws[end.ifid] = _link_bw(end)
+        load = self.loads.get(topo_id, Counter())
+        free_in = dict(bws)
+        free_eg = dict(bws)
+        for (in_ifid, eg_ifid), bw in load.items():
+            free_in[in_ifid] -= bw
+            free_eg[eg_ifid] -= bw
+        free_in = {ifid: max(0, bw) for ifid, bw in free_in.items()}
+        free_eg = {ifid: max(0, bw) for ifid, bw in free_eg.items()}
+        shares = _fit_shares(free_in, free_eg)
+        traffic_matrix = {}
+        for in_ifid in bws:
+            row = {}
+            for eg_ifid in bws:
+                if eg_ifid != in_ifid:
+                    share = int(shares[in_ifid][eg_ifid] + BW_ROUNDING)
+                    row[eg_ifid] = load[(in_ifid, eg_ifid)] + share
+            if self.matrix_format == MATRIX_COMPRESSED:
+                row = _compress_row(row)
+            traffic_matrix[in_ifid] = row
+        return traffic_matrix
+
+    def reservations(self, topo_id):
+        """
+        :returns: the planned reservations of the AS, by name.
+        """
+        return {rsvp.name(): self.reservation(rsvp) for rsvp in self.rsvps.get(topo_id, ())}
+
+    def reservation(self, rsvp):
+        start_props = {'L', 'T'}
+        end_props = {'L', 'T'}
+        if rsvp.path_type == 'Up':
+            start_props.remove('T')
+        elif rsvp.path_type == 'Down':
+            end_props.remove('T')
+        desired_size = bw_cls(rsvp.bw)
+        return {
+            'desired_size': desired_size,
+            'ia': str(rsvp.dst),
+            'max_size': bw_cls(rsvp.max_bw),
+            'min_size': min(1, desired_size),
+            'path_predicate': '%s#0' % rsvp.dst,
+            'path_type': rsvp.path_type,
+            'split_cls': DEFAULT_SPLIT_CLS,
+            'end_props': {
+                'start': sorted(start_props),
+                'end': sorted(end_props)
+            }
+        }
+
+
+def _link_bw(link):
+    """
+    :param link: a Link, or a LinkEnd.
+    :returns: the bandwidth of the link in kbps.
+    """
+    return link.attrs.get('bw', DEFAULT_LINK_BW)
+
+
+def _fit_shares(free_in, free_eg):
+    """
+    Splits the bandwidth left on every ingress over the other interfaces in proportion to the
+    bandwidth left on them, and fits the shares to both: the rows are scaled to the bandwidth left
+    on the ingresses, and the columns that exceed the bandwidth left on the egresses are scaled
+    down, for MATRIX_FIT_ROUNDS rounds. The rows start out filled, and the last step only scales
+    down, so no row or column exceeds the bandwidth left on its interface.
+
+    :returns: dict mapping every ingress to every other interface to its share of the bandwidth.
+    """
+    shares = {in_ifid: {eg_ifid: float(eg_bw) for eg_ifid, eg_bw in free_eg.items()
+                        if eg_ifid != in_ifid} for in_ifid in free_in}
+    for _ in range(MATRIX_FIT_ROUNDS):
+        for in_ifid, row in shares.items():
+            total = sum(row.values())
+            scale = free_in[in_ifid] / total if total else 0
+            for eg_ifid in row:
+                row[eg_ifid] *= scale
+        for eg_ifid, eg_bw in free_eg.items():
+            total = sum(row[eg_ifid] for row in shares.values() if eg_ifid in row)
+            if total > eg_bw:
+                scale = eg_bw / total
+                for row in shares.values():
+                    if eg_ifid in row:
+                        row[eg_ifid] *= scale
+    return shares
+
+
+def _compress_row(row):
+    if not row:
+        return {'default': 0}
+    default = Counter(row.values()).most_common(1)[0][0]
+    compressed = {'default': default}
+    exceptions = {ifid: bw for ifid, bw in row.items() if bw != default}
+    if exceptions:
+        compressed['exceptions'] = exceptions
+    return compressed
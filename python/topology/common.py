@@ -13,16 +13,23 @@
 # limitations under the License.
 
 # Stdlib
+import multiprocessing
 import os
 import subprocess
 import sys
+from collections import defaultdict
+from ipaddress import ip_network
 
 # SCION
 from lib.scion_addr import ISD_AS
-from topology.net import AddressProxy
+from lib.util import write_file
+from topology.net import AddressProxy, aggregate_nets
 
 COMMON_DIR = 'endhost'
 
+# The subnets of all SIGs, see write_remote_nets.
+SIG_REMOTE_NETS_FILE = 'sig-remote-nets.conf'
+
 SCION_SERVICE_NAMES = (
     "ControlService",
     "BorderRouters",
@@ -70,6 +77,10 @@ class ArgsTopoDicts(ArgsBase):
 
 
 class TopoID(ISD_AS):
+    __slots__ = ()
+    # The generator parses the same ISD-ASes over and over, and exits when done.
+    INTERN = True
+
     def ISD(self):
         return "ISD%s" % self.isd_str()
 
@@ -79,14 +90,11 @@ class TopoID(ISD_AS):
     def AS_file(self):
         return "AS%s" % self.as_file_fmt()
 
-    def file_fmt(self):
-        return "%s-%s" % (self.isd_str(), self.as_file_fmt())
-
     def base_dir(self, out_dir):
         return os.path.join(out_dir, self.ISD(), self.AS_file())
 
     def __lt__(self, other):
-        return str(self) < str(other)
+        return self.int() < other.int()
 
     def __repr__(self):
         return "<TopoID: %s>" % self
@@ -104,15 +112,11 @@ def prom_addr_infra(docker, infra_id, infra_ele, port):
     return "[%s]:%s" % (pub['Public']['Addr'].ip, port)
 
 
-def sciond_ip(docker, topo_id, networks):
-    for i, net in enumerate(networks):
-        for prog, ip_net in networks[net].items():
-            if prog == 'sd%s' % topo_id.file_fmt():
-                return ip_net.ip
-    return None
+def sciond_ip(docker, topo_id, elem_index):
+    return elem_index.ip(sciond_name(topo_id))
 
 
-def prom_addr_dispatcher(docker, topo_id, networks, port, name):
+def prom_addr_dispatcher(docker, topo_id, elem_index, port, name):
     if not docker:
         return "[127.0.0.1]:%s" % port
     target_name = ''
@@ -122,10 +126,10 @@ def prom_addr_dispatcher(docker, topo_id, networks, port, name):
         target_name = 'sig%s' % topo_id.file_fmt()
     else:
         target_name = 'disp%s' % topo_id.file_fmt()
-    for _, net in enumerate(networks):
-        if target_name in networks[net]:
-            return '[%s]:%s' % (networks[net][target_name].ip, port)
-    return None
+    ip = elem_index.ip(target_name)
+    if ip is None:
+        return None
+    return '[%s]:%s' % (ip, port)
 
 
 def get_pub(topo_addr):
@@ -181,18 +185,82 @@ def docker_ip():
     return subprocess.check_output(['tools/docker-ip']).decode("utf-8").strip()
 
 
-def remote_nets(networks, topo_id):
+class _JobExit(Exception):
+    """Raised in a worker process in place of SystemExit, so that the parent can exit."""
+
+
+_job_func = None
+
+
+def _run_job(item):
+    try:
+        return _job_func(item)
+    except SystemExit as e:
+        raise _JobExit(e.code) from None
+
+
+def run_jobs(jobs, func, items):
     """
-    Returns the subnets of all remote ASes the SIG in topo_id is connected to.
-    :param networks dict: Scion elem to subnet/IP map.
-    :param topo_id: A key of a topo dict generated by TopoGenerator.
-    :return: String of comma separated subnets.
+    Call func for every item, spreading the calls over a pool of forked worker processes if more
+    than one job is requested. Only the items and the return values are passed between processes,
+    so func can be a bound method or a closure.
+    :param int jobs: Number of worker processes, 0 means one per CPU.
+    :param func: Function to call for every item.
+    :param items: Iterable of picklable items.
+    :return: List of the return values of func, in the order of items.
+    """
+    global _job_func
+    items = list(items)
+    jobs = jobs or os.cpu_count()
+    if jobs == 1 or len(items) <= 1:
+        return [func(item) for item in items]
+    _job_func = func
+    try:
+        with multiprocessing.get_context('fork').Pool(min(jobs, len(items))) as pool:
+            return pool.map(_run_job, items)
+    except _JobExit as e:
+        sys.exit(e.args[0])
+    finally:
+        _job_func = None
+
+
+def sig_nets(elem_index):
+    """
+    Returns the subnets of the SIGs of all ASes.
+    :param ElementIndex elem_index: Scion elem to subnet/IP index.
+    :return: Dict mapping the TopoID of every AS with a SIG to the subnet of the SIG, as string,
+        in the order of the networks.
+    """
+    nets = {}
+    for elem in elem_index.elems('sig'):
+        nets[TopoID(elem[len('sig'):])] = str(elem_index.nets(elem)[0][0])
+    return nets
+
+
+def write_remote_nets(sig_nets, path):
+    """
+    Write the subnets that are routed through the SIGs, as "scope subnet" lines. The file is
+    shared by all ASes:
+
+    - "ISD subnet" lines hold the SIG subnets of every ISD, aggregated. An AS routes the ones of
+      all ISDs but its own.
+    - "ISD-AS subnet" lines hold the SIG subnets of every AS. An AS routes the ones of the other
+      ASes of its own ISD.
+
+    :param dict sig_nets: The SIG subnets, as returned by sig_nets.
+    :param str path: The file to write.
     """
-    rem_nets = []
-    for key in networks:
-        if 'sig' in key and topo_id.file_fmt() not in key:
-            rem_nets.append(str(networks[key][0]['net']))
-    return ','.join(rem_nets)
+    isd_nets = defaultdict(list)
+    as_nets = {}
+    for topo_id, net in sig_nets.items():
+        as_nets[topo_id] = aggregate_nets([ip_network(net)])
+        isd_nets[topo_id.isd_str()].extend(as_nets[topo_id])
+    lines = []
+    for isd, nets in isd_nets.items():
+        lines.extend('%s %s\n' % (isd, net) for net in aggregate_nets(nets))
+    for topo_id, nets in as_nets.items():
+        lines.extend('%s %s\n' % (topo_id, net) for net in nets)
+    write_file(path, ''.join(lines))
 
 
 def sciond_name(topo_id):
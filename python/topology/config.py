@@ -30,28 +30,35 @@ from lib.defines import (
     DEFAULT6_NETWORK,
     NETWORKS_FILE,
 )
-from lib.scion_addr import ISD_AS
+from lib.scion_addr import ISD_AS, format_isd_as_list, parse_isd_as_list
 from lib.util import (
     load_yaml_file,
     write_file,
 )
 from topology.cert import CertGenArgs, CertGenerator
-from topology.common import ArgsBase
+from topology.colibri import DEFAULT_CORE_RSVPS, DEFAULT_UTILIZATION
+from topology.common import ArgsBase, docker_host, sig_nets
 from topology.docker import DockerGenArgs, DockerGenerator
 from topology.go import GoGenArgs, GoGenerator
 from topology.jaeger import JaegerGenArgs, JaegerGenerator
+from topology.manifest import GenManifest
 from topology.net import (
+    ElementIndex,
     SubnetGenerator,
     DEFAULT_NETWORK,
 )
-from topology.prometheus import PrometheusGenArgs, PrometheusGenerator
+from topology.profiling import StageProfiler
+from topology.prometheus import PrometheusGenArgs, PrometheusGenerator, scrape_intervals
 from topology.supervisor import SupervisorGenArgs, SupervisorGenerator
-from topology.topo import TopoGenArgs, TopoGenerator
+from topology.topo import ASTopoWindow, TopoGenArgs, TopoGenerator
 
 DEFAULT_TOPOLOGY_FILE = "topology/Default.topo"
 
 SCIOND_ADDRESSES_FILE = "sciond_addresses.json"
 
+# Arguments that do not affect the generated output.
+NON_OUTPUT_ARGS = ('jobs', 'crypto_cache', 'profile', 'stream')
+
 
 class ConfigGenArgs(ArgsBase):
     pass
@@ -73,46 +80,126 @@ class ConfigGenerator(object):
         if self.args.sig and not self.args.docker:
             logging.critical("Cannot use sig without docker!")
             sys.exit(1)
+        if self.args.stream and (self.args.sig or self.args.colibri):
+            logging.critical("Cannot use stream with sig or colibri!")
+            sys.exit(1)
+        if self.args.seed is not None:
+            logging.warning("Deriving the master keys from the seed, use them for testing only!")
         self.default_mtu = None
         self._read_defaults(self.args.network)
+        self.args.manifest = GenManifest(self.args.output_dir, self._fingerprint())
+        self.profiler = StageProfiler(self.args.output_dir, self.args.profile)
 
     def _read_defaults(self, network):
         """
         Configure default network.
         """
         defaults = self.topo_config.get("defaults", {})
-        self.subnet_gen4 = SubnetGenerator(DEFAULT_NETWORK, self.args.docker, self.args.in_docker)
+        self.subnet_gen4 = SubnetGenerator(network or DEFAULT_NETWORK, self.args.docker,
+                                           self.args.in_docker)
         self.subnet_gen6 = SubnetGenerator(DEFAULT6_NETWORK, self.args.docker, self.args.in_docker)
         self.default_mtu = defaults.get("mtu", DEFAULT_MTU)
+        self.args.scrape_intervals = scrape_intervals(defaults.get("prometheus", {}),
+                                                      self.args.prom_scrape_interval or [])
+        colibri = defaults.get("colibri", {})
+        if self.args.colibri_demand is None:
+            self.args.colibri_demand = colibri.get("demand")
+        self.args.colibri_utilization = colibri.get("utilization", DEFAULT_UTILIZATION)
+        self.args.colibri_core_rsvps = colibri.get("core_rsvps", DEFAULT_CORE_RSVPS)
+
+    def _fingerprint(self):
+        """
+        Collect the generator-wide inputs that the output of every AS depends on.
+        """
+        fingerprint = {k: v for k, v in sorted(vars(self.args).items())
+                       if isinstance(v, (str, int, float, bool, type(None))) and
+                       k not in NON_OUTPUT_ARGS}
+        for var in ('SCION_OUTPUT_BASE', 'SCION_USERSPEC', 'DOCKER0'):
+            fingerprint[var] = os.environ.get(var)
+        fingerprint['docker_host'] = docker_host(self.args.in_docker, self.args.docker)
+        fingerprint['default_mtu'] = self.default_mtu
+        fingerprint['scrape_intervals'] = self.args.scrape_intervals
+        return fingerprint
 
     def generate_all(self):
         """
         Generate all needed files.
         """
+        stage = self.profiler.stage
         self._ensure_uniq_ases()
-        topo_dicts, self.networks = self._generate_topology()
-        self._generate_with_topo(topo_dicts)
-        self._write_networks_conf(self.networks, NETWORKS_FILE)
-        self._write_sciond_conf(self.networks, SCIOND_ADDRESSES_FILE)
+        if self.args.stream:
+            self._generate_streaming()
+        else:
+            with stage('topology'):
+                topo_dicts, self.networks = self._generate_topology()
+            self._generate_with_topo(topo_dicts)
+        with stage('networks'):
+            self._write_networks_conf(self.networks, NETWORKS_FILE)
+            self._write_sciond_conf(self.networks, SCIOND_ADDRESSES_FILE)
+        with stage('manifest'):
+            self.args.manifest.write()
+        self.profiler.write()
+
+    def _generate_streaming(self):
+        """
+        Generate the per-AS output one AS at a time, after the addresses of all ASes have been
+        allocated, so that the topologies of all ASes are never held in memory at once.
+        """
+        stage = self.profiler.stage
+        topo_gen = TopoGenerator(self._topo_args())
+        with stage('topology'):
+            self.networks, as_topos = topo_gen.stream()
+            self.args.elem_index = ElementIndex(self.networks)
+        self.args.links = topo_gen.links
+        window = ASTopoWindow(topo_gen.topo_ids())
+        with stage('certs'):
+            cert_gen = CertGenerator(self._cert_args())
+            cert_gen.generate_isds(window)
+        go_gen = GoGenerator(self._go_args(window))
+        if self.args.docker:
+            layout_gen = DockerGenerator(self._docker_args(window))
+        else:
+            layout_gen = SupervisorGenerator(self._supervisor_args(window))
+        prom_gen = PrometheusGenerator(self._prometheus_args(window))
+        with stage('ases'):
+            for topo_id, as_topo in as_topos:
+                window.set(topo_id, as_topo)
+                go_gen.generate_as(topo_id)
+                layout_gen.generate_as(topo_id)
+                prom_gen.generate_as(topo_id)
+                cert_gen.copy_files({topo_id: as_topo})
+            window.set(None, None)
+        with stage('common'):
+            go_gen.generate_common()
+            layout_gen.generate_common()
+            self._generate_jaeger(window)
+            prom_gen.generate_common()
 
     def _ensure_uniq_ases(self):
         seen = set()
-        for asStr in self.topo_config["ASes"]:
-            ia = ISD_AS(asStr)
-            if ia.as_str() in seen:
-                logging.critical("Non-unique AS Id '%s'", ia.as_str())
+        for isd_as in parse_isd_as_list(self.topo_config["ASes"]):
+            as_ = isd_as & ISD_AS.MAX_AS
+            if as_ in seen:
+                logging.critical("Non-unique AS Id '%s'", ISD_AS.from_int(isd_as).as_str())
                 sys.exit(1)
-            seen.add(ia.as_str())
+            seen.add(as_)
 
     def _generate_with_topo(self, topo_dicts):
-        self._generate_go(topo_dicts)
+        stage = self.profiler.stage
+        with stage('go'):
+            self._generate_go(topo_dicts)
         if self.args.docker:
-            self._generate_docker(topo_dicts)
+            with stage('docker'):
+                self._generate_docker(topo_dicts)
         else:
-            self._generate_supervisor(topo_dicts)
-        self._generate_jaeger(topo_dicts)
-        self._generate_prom_conf(topo_dicts)
-        self._generate_certs_trcs(topo_dicts)
+            with stage('supervisor'):
+                self._generate_supervisor(topo_dicts)
+        with stage('jaeger'):
+            self._generate_jaeger(topo_dicts)
+        with stage('prometheus'):
+            self._generate_prom_conf(topo_dicts)
+        with stage('certs'):
+            self._generate_certs_trcs(topo_dicts)
 
     def _generate_certs_trcs(self, topo_dicts):
         certgen = CertGenerator(self._cert_args())
@@ -140,7 +227,12 @@ class ConfigGenerator(object):
 
     def _generate_topology(self):
         topo_gen = TopoGenerator(self._topo_args())
-        return topo_gen.generate()
+        topo_dicts, networks = topo_gen.generate()
+        self.args.links = topo_gen.links
+        self.args.elem_index = ElementIndex(networks)
+        if self.args.sig:
+            self.args.sig_nets = sig_nets(self.args.elem_index)
+        return topo_dicts, networks
 
     def _topo_args(self):
         return TopoGenArgs(self.args, self.topo_config, self.subnet_gen4,
@@ -191,11 +283,13 @@ class ConfigGenerator(object):
         write_file(os.path.join(self.args.output_dir, out_file), text.getvalue())
 
     def _write_sciond_conf(self, networks, out_file):
-        d = dict()
+        ias = []
+        ips = []
         for i, net in enumerate(networks):
             for prog, ip_net in networks[net].items():
                 if prog.startswith("sd"):
-                    ia = prog[2:].replace("_", ":")
-                    d[ia] = str(ip_net.ip)
+                    ias.append(prog[2:])
+                    ips.append(str(ip_net.ip))
+        d = dict(zip(format_isd_as_list(parse_isd_as_list(ias)), ips))
         with open(os.path.join(self.args.output_dir, out_file), mode="w") as f:
             json.dump(d, f, sort_keys=True, indent=4)
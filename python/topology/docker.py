@@ -15,8 +15,6 @@
 # Stdlib
 import copy
 import os
-# External packages
-import yaml
 # SCION
 from lib.defines import DOCKER_COMPOSE_CONFIG_VERSION
 from lib.util import (
@@ -24,12 +22,15 @@ from lib.util import (
 )
 from topology.common import (
     ArgsTopoDicts,
+    COMMON_DIR,
     docker_image,
     DOCKER_USR_VOL,
     sciond_svc_name
 )
 from topology.docker_utils import DockerUtilsGenArgs, DockerUtilsGenerator
+from topology.serialize import dump_yaml
 from topology.sig import SIGGenArgs, SIGGenerator
+from topology.topo import TOPO_FILES_SYMLINK
 
 DOCKER_CONF = 'scion-dc.yml'
 
@@ -58,19 +59,31 @@ class DockerGenerator(object):
         self.output_base = os.environ.get('SCION_OUTPUT_BASE', os.getcwd())
         self.user_spec = os.environ.get('SCION_USERSPEC', '$LOGNAME')
         self.prefix = 'scion_docker_' if self.args.in_docker else 'scion_'
+        self._create_networks()
 
     def generate(self):
-        self._create_networks()
-        for topo_id, topo in self.args.topo_dicts.items():
-            base = os.path.join(self.output_base, topo_id.base_dir(self.args.output_dir))
-            self._gen_topo(topo_id, topo, base)
+        for topo_id in self.args.topo_dicts:
+            self.generate_as(topo_id)
+        self.generate_common()
+
+    def generate_as(self, topo_id):
+        """
+        Add the services of a single AS to the compose config.
+        """
+        base = os.path.join(self.output_base, topo_id.base_dir(self.args.output_dir))
+        self._gen_topo(topo_id, self.args.topo_dicts[topo_id], base)
+
+    def generate_common(self):
+        """
+        Add the services that are not specific to an AS, and write the compose config.
+        """
         if self.args.sig:
             self._gen_sig()
         docker_utils_gen = DockerUtilsGenerator(self._docker_utils_args())
         self.dc_conf = docker_utils_gen.generate()
 
         write_file(os.path.join(self.args.output_dir, DOCKER_CONF),
-                   yaml.dump(self.dc_conf, default_flow_style=False))
+                   dump_yaml(self.dc_conf))
 
     def _docker_utils_args(self):
         return DockerUtilsGenArgs(self.args, self.dc_conf, self.bridges, self.elem_networks)
@@ -133,7 +146,8 @@ class DockerGenerator(object):
                     *DOCKER_USR_VOL,
                     self._disp_vol(disp_id),
                     self._logs_vol(),
-                    '%s:/share/conf:ro' % os.path.join(base, k)
+                    '%s:/share/conf:ro' % os.path.join(base, k),
+                    *self._topo_vols(base),
                 ],
                 'command': []
             }
@@ -171,6 +185,7 @@ class DockerGenerator(object):
                     self._logs_vol(),
                     self._certs_vol(),
                     '%s:/share/conf:ro' % os.path.join(base, k),
+                    *self._topo_vols(base),
                     self._disp_vol(k),
                 ],
                 'command': []
@@ -247,6 +262,15 @@ class DockerGenerator(object):
     def _logs_vol(self):
         return self.output_base + '/logs:/share/logs:rw'
 
+    def _topo_vols(self, base):
+        """
+        The volumes the symlinked topology.json of an element needs: the link points from the
+        conf dir to ../endhost/topology.json.
+        """
+        if self.args.topo_files != TOPO_FILES_SYMLINK:
+            return []
+        return ['%s:/share/%s:ro' % (os.path.join(base, COMMON_DIR), COMMON_DIR)]
+
     def _cache_vol(self):
         return self.output_base + '/gen-cache:/share/cache:rw'
 
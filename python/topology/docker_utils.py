@@ -17,7 +17,7 @@
 import os
 # SCION
 from lib.util import write_file
-from topology.common import ArgsBase, docker_image, remote_nets
+from topology.common import ArgsBase, docker_image, SIG_REMOTE_NETS_FILE
 
 
 class DockerUtilsGenArgs(ArgsBase):
@@ -98,11 +98,14 @@ class DockerUtilsGenerator(object):
         entry['networks'][bridge] = {'%s_address' % ipv: str(net[ipv])}
         if self.args.sig:
             # If the tester container needs to communicate to the SIG, it needs the SIG_IP and
-            # REMOTE_NETS which are the remote subnets that need to be routed through the SIG.
+            # REMOTE_NETS_FILE which lists the subnets that need to be routed through the SIG,
+            # except the ones of ISD_AS.
             # net information for the connected SIG
             sig_net = self.args.networks['sig%s' % topo_id.file_fmt()][0]
             entry['environment']['SIG_IP'] = str(sig_net[ipv])
-            entry['environment']['REMOTE_NETS'] = remote_nets(self.args.networks, topo_id)
+            entry['environment']['REMOTE_NETS_FILE'] = os.path.join(cntr_base, 'gen',
+                                                                    SIG_REMOTE_NETS_FILE)
+            entry['environment']['ISD_AS'] = str(topo_id)
         self.dc_conf['services'][name] = entry
 
     def _sig_testing_conf(self):
@@ -23,12 +23,17 @@ import argparse
 # SCION
 from lib.defines import (
     GEN_PATH,
+    GEN_PROFILE_FILE,
 )
+from topology.colibri import MATRIX_DENSE, MATRIX_FORMATS
 from topology.config import (
     ConfigGenerator,
     ConfigGenArgs,
     DEFAULT_TOPOLOGY_FILE,
 )
+from topology.profiling import PROFILE_MODES, PROFILE_TIME
+from topology.prometheus import PROM_DC_FILE
+from topology.topo import TOPO_FILES_COPY, TOPO_FILES_MODES
 
 
 def add_arguments(parser):
@@ -47,6 +52,12 @@ def add_arguments(parser):
                         available timeout')
     parser.add_argument('--random-ifids', action='store_true',
                         help='Generate random IFIDs')
+    parser.add_argument('--seed', type=int,
+                        help='Seed all random choices of the generator, i.e. the random IFIDs and\
+                        the master keys, so that regenerating a topology yields identical\
+                        output. The master keys are derived from the seed and must only be used\
+                        for testing. The keys and certificates generated by scion-pki are not\
+                        seeded, use --crypto-cache to keep them stable')
     parser.add_argument('--in-docker', action='store_true',
                         help='Set if running in a docker container')
     parser.add_argument('--docker-registry', help='Specify docker registry to pull images from')
@@ -56,6 +67,48 @@ def add_arguments(parser):
                         to be built manually e.g. when running acceptance tests)')
     parser.add_argument('-qos', '--colibri', action='store_true',
                         help='Generate COLIBRI service')
+    parser.add_argument('--colibri-matrix', choices=MATRIX_FORMATS, default=MATRIX_DENSE,
+                        help='Format of the COLIBRI traffic matrices: every ingress to every\
+                        egress (dense), or per ingress the most common bandwidth and the\
+                        egresses that differ from it (compressed)')
+    parser.add_argument('--colibri-demand', type=int, metavar='KBPS',
+                        help='Bandwidth every COLIBRI reservation asks for, in kbps. Overrides\
+                        the colibri demand in the defaults of the topology config, by default\
+                        the reservations share the link bandwidth evenly')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Number of worker processes used to write the per-AS configs\
+                        (0 means one per CPU)')
+    parser.add_argument('--crypto-cache',
+                        help='Directory to cache the generated crypto material in, and reuse it\
+                        from for ISDs whose AS roles did not change')
+    parser.add_argument('--prom-consolidated', action='store_true',
+                        help='Write a single Prometheus target file per job, with the targets of\
+                        all ASes labelled by isd_as and element, instead of target files and a\
+                        prometheus.yml per AS')
+    parser.add_argument('--prom-scrape-interval', action='append', metavar='[JOB=]INTERVAL',
+                        help='Prometheus scrape interval, of all jobs or of one of the jobs BR,\
+                        CS, SD and dispatcher (e.g. 15s or BR=1m, can be repeated). Overrides\
+                        the prometheus defaults of the topology config')
+    parser.add_argument('--prom-shards', type=int, default=1,
+                        help='Additionally write this many Prometheus configs, each scraping a\
+                        disjoint share of the targets by hashmod of their address, and run one\
+                        Prometheus per share in %s' % PROM_DC_FILE)
+    parser.add_argument('--compact-json', action='store_true',
+                        help='Write the topology.json files on a single line, without\
+                        indentation')
+    parser.add_argument('--topo-files', choices=TOPO_FILES_MODES, default=TOPO_FILES_COPY,
+                        help='Write the topology.json of an AS into the directory of every\
+                        element (copy), or once into its endhost directory and link it from\
+                        the element directories (hardlink, symlink). With -d and symlink, the\
+                        endhost directory is mounted into the containers')
+    parser.add_argument('--stream', action='store_true',
+                        help='Generate the per-AS configs one AS at a time, instead of holding\
+                        the topologies of all ASes in memory (not available with --sig or\
+                        --colibri, the per-AS configs are not generated in parallel)')
+    parser.add_argument('--profile', nargs='?', choices=PROFILE_MODES, const=PROFILE_TIME,
+                        help='Record the time spent and the files written in every generation\
+                        stage, optionally profiling the stages with cprofile or tracemalloc,\
+                        and write a report to %s in the output directory' % GEN_PROFILE_FILE)
     return parser
 
 
@@ -18,8 +18,6 @@
 """
 # Stdlib
 import os
-import toml
-import yaml
 
 # SCION
 from lib.util import write_file
@@ -35,6 +33,7 @@ from topology.common import (
     prom_addr_br,
     prom_addr_infra,
     prom_addr_dispatcher,
+    run_jobs,
     sciond_ip,
     sciond_name,
     SD_API_PORT,
@@ -42,6 +41,7 @@ from topology.common import (
     CO_CONFIG_NAME,
 )
 
+from topology.colibri import ColibriPlanner
 from topology.net import socket_address_str
 
 from topology.prometheus import (
@@ -51,7 +51,7 @@ from topology.prometheus import (
     DISP_PROM_PORT,
     CO_PROM_PORT,
 )
-from topology.topo import DEFAULT_LINK_BW
+from topology.serialize import dump_yaml, TOMLTemplate
 
 CS_QUIC_PORT = 30352
 CO_QUIC_PORT = 30357
@@ -74,16 +74,52 @@ class GoGenerator(object):
         self.db_dir = '/share/cache' if args.docker else 'gen-cache'
         self.certs_dir = '/share/crypto' if args.docker else 'gen-certs'
         self.log_level = 'trace' if args.trace else 'debug'
+        # The configs of a role only differ in the fields of the elements, so every role's config
+        # is serialised once, and rendered per element from the template.
+        self._br_tmpl = TOMLTemplate(self._build_br_conf, ('name', 'config_dir', 'prom_addr'))
+        self._cs_tmpl = TOMLTemplate(self._build_control_service_conf,
+                                     ('name', 'config_dir', 'prom_addr', 'quic_addr'))
+        self._co_tmpl = TOMLTemplate(self._build_co_conf,
+                                     ('name', 'config_dir', 'prom_addr', 'quic_addr'))
+        self._sd_tmpl = TOMLTemplate(self._build_sciond_conf,
+                                     ('name', 'config_dir', 'sd_addr', 'prom_addr', 'quic_addr'))
+        self._disp_tmpl = TOMLTemplate(self._build_disp_conf, ('name', 'prom_addr'))
+
+    def generate_as(self, topo_id):
+        """
+        Generate the configs of a single AS, for the streaming mode. The ColibriService is not
+        supported, as its reservations depend on the topologies of all ASes.
+        """
+        self._gen_as_br(topo_id)
+        self._gen_as_control_service(topo_id)
+        self._gen_as_sciond(topo_id)
+        if self.args.docker:
+            self._gen_as_disp_docker(topo_id)
+
+    def generate_common(self):
+        """
+        Generate the configs that are not specific to an AS, for the streaming mode.
+        """
+        if not self.args.docker:
+            self._gen_disp_host()
 
     def generate_br(self):
-        for topo_id, topo in self.args.topo_dicts.items():
-            for k, v in topo.get("BorderRouters", {}).items():
-                base = topo_id.base_dir(self.args.output_dir)
-                br_conf = self._build_br_conf(topo_id, topo["ISD_AS"], base, k, v)
-                write_file(os.path.join(base, k, BR_CONFIG_NAME), toml.dumps(br_conf))
+        run_jobs(self.args.jobs, self._gen_as_br, self.args.topo_dicts)
 
-    def _build_br_conf(self, topo_id, ia, base, name, v):
-        config_dir = '/share/conf' if self.args.docker else os.path.join(base, name)
+    def _gen_as_br(self, topo_id):
+        if self.args.manifest.is_unchanged(topo_id):
+            return
+        topo = self.args.topo_dicts[topo_id]
+        base = topo_id.base_dir(self.args.output_dir)
+        for k, v in topo.get("BorderRouters", {}).items():
+            br_conf = self._br_tmpl.render(
+                name=k,
+                config_dir=self._config_dir(base, k),
+                prom_addr=prom_addr_br(k, v, DEFAULT_BR_PROM_PORT),
+            )
+            write_file(os.path.join(base, k, BR_CONFIG_NAME), br_conf)
+
+    def _build_br_conf(self, name, config_dir, prom_addr):
         raw_entry = {
             'general': {
                 'id': name,
@@ -91,25 +127,31 @@ class GoGenerator(object):
             },
             'log': self._log_entry(name),
             'metrics': {
-                'prometheus': prom_addr_br(name, v, DEFAULT_BR_PROM_PORT),
+                'prometheus': prom_addr,
             },
         }
         return raw_entry
 
     def generate_control_service(self):
-        for topo_id, topo in self.args.topo_dicts.items():
-            for elem_id, elem in topo.get("ControlService", {}).items():
-                # only a single Go-BS per AS is currently supported
-                if elem_id.endswith("-1"):
-                    base = topo_id.base_dir(self.args.output_dir)
-                    bs_conf = self._build_control_service_conf(
-                        topo_id, topo["ISD_AS"], base, elem_id, elem)
-                    write_file(os.path.join(base, elem_id,
-                                            CS_CONFIG_NAME), toml.dumps(bs_conf))
-
-    def _build_control_service_conf(self, topo_id, ia, base, name, infra_elem):
-        config_dir = '/share/conf' if self.args.docker else os.path.join(
-            base, name)
+        run_jobs(self.args.jobs, self._gen_as_control_service, self.args.topo_dicts)
+
+    def _gen_as_control_service(self, topo_id):
+        if self.args.manifest.is_unchanged(topo_id):
+            return
+        topo = self.args.topo_dicts[topo_id]
+        for elem_id, elem in topo.get("ControlService", {}).items():
+            # only a single Go-BS per AS is currently supported
+            if elem_id.endswith("-1"):
+                base = topo_id.base_dir(self.args.output_dir)
+                bs_conf = self._cs_tmpl.render(
+                    name=elem_id,
+                    config_dir=self._config_dir(base, elem_id),
+                    prom_addr=prom_addr_infra(self.args.docker, elem_id, elem, CS_PROM_PORT),
+                    quic_addr=self._quic_address(CS_QUIC_PORT, elem),
+                )
+                write_file(os.path.join(base, elem_id, CS_CONFIG_NAME), bs_conf)
+
+    def _build_control_service_conf(self, name, config_dir, prom_addr, quic_addr):
         raw_entry = {
             'general': {
                 'id': name,
@@ -130,30 +172,39 @@ class GoGenerator(object):
                 'connection': os.path.join(self.db_dir, '%s.path.db' % name),
             },
             'tracing': self._tracing_entry(),
-            'metrics': self._metrics_entry(name, infra_elem, CS_PROM_PORT),
-            'quic': self._quic_conf_entry(CS_QUIC_PORT, self.args.svcfrac, infra_elem),
+            'metrics': {
+                'prometheus': prom_addr,
+            },
+            'quic': self._quic_conf_entry(quic_addr, self.args.svcfrac),
         }
         return raw_entry
 
     def generate_co(self):
         if not self.args.colibri:
             return
+        planner = ColibriPlanner(self.args.topo_dicts, self.args.links,
+                                 self.args.colibri_matrix, self.args.colibri_demand,
+                                 self.args.colibri_utilization, self.args.colibri_core_rsvps)
         for topo_id, topo in self.args.topo_dicts.items():
             for elem_id, elem in topo.get("ColibriService", {}).items():
                 # only a single Go-CO per AS is currently supported
                 if elem_id.endswith("-1"):
                     base = topo_id.base_dir(self.args.output_dir)
-                    co_conf = self._build_co_conf(topo_id, topo["ISD_AS"], base, elem_id, elem)
-                    write_file(os.path.join(base, elem_id, CO_CONFIG_NAME), toml.dumps(co_conf))
-                    traffic_matrix = self._build_co_traffic_matrix(topo_id)
+                    co_conf = self._co_tmpl.render(
+                        name=elem_id,
+                        config_dir=self._config_dir(base, elem_id),
+                        prom_addr=prom_addr_infra(self.args.docker, elem_id, elem, CO_PROM_PORT),
+                        quic_addr=self._quic_address(CO_QUIC_PORT, elem),
+                    )
+                    write_file(os.path.join(base, elem_id, CO_CONFIG_NAME), co_conf)
+                    traffic_matrix = planner.traffic_matrix(topo_id)
                     write_file(os.path.join(base, elem_id, 'matrix.yml'),
-                               yaml.dump(traffic_matrix, default_flow_style=False))
-                    rsvps = self._build_co_reservations(topo_id)
+                               dump_yaml(traffic_matrix))
+                    rsvps = planner.reservations(topo_id)
                     write_file(os.path.join(base, elem_id, 'reservations.yml'),
-                               yaml.dump(rsvps, default_flow_style=False))
+                               dump_yaml(rsvps))
 
-    def _build_co_conf(self, topo_id, ia, base, name, infra_elem):
-        config_dir = '/share/conf' if self.args.docker else os.path.join(base, name)
+    def _build_co_conf(self, name, config_dir, prom_addr, quic_addr):
         raw_entry = {
             'general': {
                 'ID': name,
@@ -166,76 +217,31 @@ class GoGenerator(object):
                 'connection': os.path.join(self.db_dir, '%s.trust.db' % name),
             },
             'tracing': self._tracing_entry(),
-            'metrics': self._metrics_entry(name, infra_elem, CO_PROM_PORT),
-            'quic': self._quic_conf_entry(CO_QUIC_PORT, self.args.svcfrac, infra_elem),
+            'metrics': {
+                'prometheus': prom_addr,
+            },
+            'quic': self._quic_conf_entry(quic_addr, self.args.svcfrac),
         }
         return raw_entry
 
-    def _build_co_traffic_matrix(self, ia):
-        """
-        Creates a NxN traffic matrix for colibri with N = len(interfaces)
-        """
-        topo = self.args.topo_dicts[ia]
-        if_ids = {iface for br in topo['BorderRouters'].values() for iface in br['Interfaces']}
-        if_ids.add(0)
-        bw = int(DEFAULT_LINK_BW / (len(if_ids) - 1))
-        traffic_matrix = {}
-        for inIfid in if_ids:
-            traffic_matrix[inIfid] = {}
-            for egIfid in if_ids.difference({inIfid}):
-                traffic_matrix[inIfid][egIfid] = bw
-        return traffic_matrix
-
-    def _build_co_reservations(self, ia):
-        """
-        Generates a dictionary of reservations with one entry per core AS (if "ia" is core)
-        excluding itself, or a pair (up and down) per core AS in the ISD if "ia" is not core.
-        """
-        rsvps = {}
-        this_as = self.args.topo_dicts[ia]
-        if this_as['Core']:
-            for dst_ia, topo in self.args.topo_dicts.items():
-                if dst_ia != ia and topo['Core']:
-                    rsvps['Core-%s' % dst_ia] = self._build_co_reservation(dst_ia, 'Core')
-        else:
-            for dst_ia, topo in self.args.topo_dicts.items():
-                if dst_ia != ia and dst_ia._isd == ia._isd and topo['Core']:
-                    # reach this core AS in the same ISD
-                    rsvps['Up-%s' % dst_ia] = self._build_co_reservation(dst_ia, 'Up')
-                    rsvps['Down-%s' % dst_ia] = self._build_co_reservation(dst_ia, 'Down')
-        return rsvps
-
-    def _build_co_reservation(self, dst_ia, path_type):
-        start_props = {'L', 'T'}
-        end_props = {'L', 'T'}
-        if path_type == 'Up':
-            start_props.remove('T')
-        elif path_type == 'Down':
-            end_props.remove('T')
-        return {
-            'desired_size': 27,
-            'ia': str(dst_ia),
-            'max_size': 30,
-            'min_size': 1,
-            'path_predicate': '%s#0' % dst_ia,
-            'path_type': path_type,
-            'split_cls': 8,
-            'end_props': {
-                'start': list(start_props),
-                'end': list(end_props)
-            }
-        }
-
     def generate_sciond(self):
-        for topo_id, topo in self.args.topo_dicts.items():
-            base = topo_id.base_dir(self.args.output_dir)
-            sciond_conf = self._build_sciond_conf(topo_id, topo["ISD_AS"], base)
-            write_file(os.path.join(base, COMMON_DIR, SD_CONFIG_NAME), toml.dumps(sciond_conf))
-
-    def _build_sciond_conf(self, topo_id, ia, base):
-        name = sciond_name(topo_id)
-        config_dir = '/share/conf' if self.args.docker else os.path.join(base, COMMON_DIR)
-        ip = sciond_ip(self.args.docker, topo_id, self.args.networks)
+        run_jobs(self.args.jobs, self._gen_as_sciond, self.args.topo_dicts)
+
+    def _gen_as_sciond(self, topo_id):
+        if self.args.manifest.is_unchanged(topo_id):
+            return
+        base = topo_id.base_dir(self.args.output_dir)
+        ip = sciond_ip(self.args.docker, topo_id, self.args.elem_index)
+        sciond_conf = self._sd_tmpl.render(
+            name=sciond_name(topo_id),
+            config_dir=self._config_dir(base, COMMON_DIR),
+            sd_addr=socket_address_str(ip, SD_API_PORT),
+            prom_addr=socket_address_str(ip, SCIOND_PROM_PORT),
+            quic_addr=socket_address_str(ip, SD_QUIC_PORT),
+        )
+        write_file(os.path.join(base, COMMON_DIR, SD_CONFIG_NAME), sciond_conf)
+
+    def _build_sciond_conf(self, name, config_dir, sd_addr, prom_addr, quic_addr):
         raw_entry = {
             'general': {
                 'id': name,
@@ -251,50 +257,63 @@ class GoGenerator(object):
                 'connection': os.path.join(self.db_dir, '%s.path.db' % name),
             },
             'sd': {
-                'address': socket_address_str(ip, SD_API_PORT),
+                'address': sd_addr,
             },
             'tracing': self._tracing_entry(),
             'metrics': {
-                'prometheus': socket_address_str(ip, SCIOND_PROM_PORT)
+                'prometheus': prom_addr,
             },
-            'quic': self._quic_conf_entry(SD_QUIC_PORT, self.args.svcfrac),
+            'quic': self._quic_conf_entry(quic_addr, self.args.svcfrac),
         }
-        raw_entry['quic']['address'] = socket_address_str(ip, SD_QUIC_PORT)
         return raw_entry
 
     def generate_disp(self):
         if self.args.docker:
             self._gen_disp_docker()
         else:
-            elem_dir = os.path.join(self.args.output_dir, "dispatcher")
-            config_file_path = os.path.join(elem_dir, DISP_CONFIG_NAME)
-            write_file(config_file_path, toml.dumps(self._build_disp_conf("dispatcher")))
+            self._gen_disp_host()
+
+    def _gen_disp_host(self):
+        elem_dir = os.path.join(self.args.output_dir, "dispatcher")
+        config_file_path = os.path.join(elem_dir, DISP_CONFIG_NAME)
+        write_file(config_file_path, self._render_disp_conf("dispatcher"))
 
     def _gen_disp_docker(self):
-        for topo_id, topo in self.args.topo_dicts.items():
-            elem = "disp_sig_%s" % topo_id.file_fmt()
-            elem_dir = os.path.join(topo_id.base_dir(self.args.output_dir), elem)
-            disp_conf = self._build_disp_conf(elem, topo_id)
-            write_file(os.path.join(elem_dir, DISP_CONFIG_NAME), toml.dumps(disp_conf))
-            for k in list(topo.get("BorderRouters", {})) + list(topo.get("ControlService", {})):
-                disp_id = 'disp_%s' % k
-                elem_dir = os.path.join(topo_id.base_dir(self.args.output_dir), disp_id)
-                disp_conf = self._build_disp_conf(disp_id, topo_id)
-                write_file(os.path.join(elem_dir, DISP_CONFIG_NAME), toml.dumps(disp_conf))
-
-    def _build_disp_conf(self, name, topo_id=None):
+        run_jobs(self.args.jobs, self._gen_as_disp_docker, self.args.topo_dicts)
+
+    def _gen_as_disp_docker(self, topo_id):
+        if self.args.manifest.is_unchanged(topo_id):
+            return
+        topo = self.args.topo_dicts[topo_id]
+        elem = "disp_sig_%s" % topo_id.file_fmt()
+        elem_dir = os.path.join(topo_id.base_dir(self.args.output_dir), elem)
+        disp_conf = self._render_disp_conf(elem, topo_id)
+        write_file(os.path.join(elem_dir, DISP_CONFIG_NAME), disp_conf)
+        for k in list(topo.get("BorderRouters", {})) + list(topo.get("ControlService", {})):
+            disp_id = 'disp_%s' % k
+            elem_dir = os.path.join(topo_id.base_dir(self.args.output_dir), disp_id)
+            disp_conf = self._render_disp_conf(disp_id, topo_id)
+            write_file(os.path.join(elem_dir, DISP_CONFIG_NAME), disp_conf)
+
+    def _render_disp_conf(self, name, topo_id=None):
         prometheus_addr = prom_addr_dispatcher(self.args.docker, topo_id,
-                                               self.args.networks, DISP_PROM_PORT, name)
+                                               self.args.elem_index, DISP_PROM_PORT, name)
+        return self._disp_tmpl.render(name=name, prom_addr=prometheus_addr)
+
+    def _build_disp_conf(self, name, prom_addr):
         return {
             'dispatcher': {
                 'id': name,
             },
             'log': self._log_entry(name),
             'metrics': {
-                'prometheus': prometheus_addr,
+                'prometheus': prom_addr,
             },
         }
 
+    def _config_dir(self, base, name):
+        return '/share/conf' if self.args.docker else os.path.join(base, name)
+
     def _tracing_entry(self):
         docker_ip = docker_host(self.args.in_docker, self.args.docker)
         entry = {
@@ -313,19 +332,16 @@ class GoGenerator(object):
         }
         return entry
 
-    def _metrics_entry(self, name, infra_elem, base_port):
-        prom_addr = prom_addr_infra(self.args.docker, name, infra_elem, base_port)
-        return {
-            'prometheus': prom_addr
-        }
-
-    def _quic_conf_entry(self, port, svcfrac, elem=None):
+    def _quic_address(self, port, elem=None):
         addr = "127.0.0.1" if elem is None else get_pub_ip(elem["Addrs"])
         if self.args.docker and elem is not None:
             pub = get_pub(elem['Addrs'])
             port = pub['Public']['L4Port']+1
+        return '[%s]:%s' % (addr, port)
+
+    def _quic_conf_entry(self, address, svcfrac):
         return {
-            'address':  '[%s]:%s' % (addr, port),
+            'address': address,
             'cert_file': os.path.join(self.certs_dir, 'tls.pem'),
             'key_file': os.path.join(self.certs_dir, 'tls.key'),
             'resolution_fraction': svcfrac,
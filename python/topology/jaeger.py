@@ -13,12 +13,12 @@
 # limitations under the License.
 
 import os
-import yaml
 
 from lib.util import write_file
 from topology.common import (
     ArgsTopoDicts,
 )
+from topology.serialize import dump_yaml
 
 JAEGER_DC = 'jaeger-dc.yml'
 
@@ -40,7 +40,7 @@ class JaegerGenerator(object):
         os.makedirs(os.path.join(self.local_jaeger_dir, 'data'), exist_ok=True)
         os.makedirs(os.path.join(self.local_jaeger_dir, 'key'), exist_ok=True)
         write_file(os.path.join(self.args.output_dir, JAEGER_DC),
-                   yaml.dump(dc_conf, default_flow_style=False))
+                   dump_yaml(dc_conf))
 
     def _generate_dc(self):
         name = 'jaeger-docker' if self.args.in_docker else 'jaeger'
@@ -0,0 +1,147 @@
+# Copyright 2020 Anapaya Systems
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+:mod:`links` --- SCION topology link graph
+==========================================
+"""
+# Stdlib
+from collections import defaultdict
+
+
+class Link(object):
+    """
+    An inter-AS link between the interface a_ifid of BR a_br in AS a, and the interface b_ifid
+    of BR b_br in AS b.
+    """
+    __slots__ = ('id', 'a', 'b', 'a_br', 'b_br', 'a_ifid', 'b_ifid', 'a_type', 'b_type',
+                 'attrs', 'subnet')
+
+    def __init__(self, link_id, a, b, a_type, b_type, attrs, a_br, b_br, a_ifid, b_ifid):
+        """
+        :param int link_id: the ID of the link in its graph.
+        :param LinkEP a: the first endpoint.
+        :param LinkEP b: the second endpoint.
+        :param str a_type: the type of a, as seen from b.
+        :param str b_type: the type of b, as seen from a.
+        :param dict attrs: the remaining attributes of the link in the topology config.
+        :param str a_br: the BR of the link in a.
+        :param str b_br: the BR of the link in b.
+        :param int a_ifid: the interface of the link in a.
+        :param int b_ifid: the interface of the link in b.
+        """
+        self.id = link_id
+        self.a = a
+        self.b = b
+        self.a_type = a_type
+        self.b_type = b_type
+        self.attrs = attrs
+        self.a_br = a_br
+        self.b_br = b_br
+        self.a_ifid = a_ifid
+        self.b_ifid = b_ifid
+        # The name the subnet of the link is registered under.
+        self.subnet = str(sorted((a_br, b_br))) + str(sorted((a_ifid, b_ifid)))
+
+    def end(self, side):
+        """
+        :param int side: 0 for the end in a, 1 for the end in b.
+        :returns: the LinkEnd of the link on the given side.
+        """
+        if side == 0:
+            return LinkEnd(self, self.a_br, self.a_ifid, self.b, self.b_br, self.b_ifid,
+                           self.b_type)
+        return LinkEnd(self, self.b_br, self.b_ifid, self.a, self.a_br, self.a_ifid, self.a_type)
+
+
+class LinkEnd(object):
+    """
+    One end of a link, as seen from the local AS.
+    """
+    __slots__ = ('link', 'br', 'ifid', 'remote', 'remote_br', 'remote_ifid', 'remote_type')
+
+    def __init__(self, link, br, ifid, remote, remote_br, remote_ifid, remote_type):
+        self.link = link
+        self.br = br
+        self.ifid = ifid
+        self.remote = remote
+        self.remote_br = remote_br
+        self.remote_ifid = remote_ifid
+        self.remote_type = remote_type
+
+    @property
+    def attrs(self):
+        return self.link.attrs
+
+
+class LinkGraph(object):
+    """
+    The inter-AS links of a topology, indexed by AS, by BR and by link type. Links are
+    identified by their index in the order they were added.
+    """
+
+    def __init__(self):
+        self._links = []
+        # LinkEnds by AS, resp. by BR, and by AS and remote type.
+        self._by_as = defaultdict(list)
+        self._by_br = defaultdict(list)
+        self._by_remote_type = defaultdict(list)
+        # link ids by the link type, as given in the topology config.
+        self._by_type = defaultdict(list)
+
+    def add(self, a, b, link_type, a_type, b_type, attrs, a_br, b_br, a_ifid, b_ifid):
+        """
+        Add a link, see Link for the parameters.
+
+        :param str link_type: the type of the link in the topology config.
+        :returns: the added Link.
+        """
+        link = Link(len(self._links), a, b, a_type, b_type, attrs, a_br, b_br, a_ifid, b_ifid)
+        self._links.append(link)
+        for topo_id, end in ((a, link.end(0)), (b, link.end(1))):
+            self._by_as[topo_id].append(end)
+            self._by_br[end.br].append(end)
+            self._by_remote_type[(topo_id, end.remote_type.lower())].append(end)
+        self._by_type[link_type.lower()].append(link.id)
+        return link
+
+    def ends(self, topo_id, remote_type=None):
+        """
+        :param str remote_type: if set, only the LinkEnds towards remote ASes of this LinkType.
+        :returns: the LinkEnds in the AS topo_id, in the order the links were added.
+        """
+        if remote_type is None:
+            return self._by_as.get(topo_id, [])
+        return self._by_remote_type.get((topo_id, remote_type.lower()), [])
+
+    def br_ends(self, br):
+        """
+        :returns: the LinkEnds of the BR br, in the order the links were added.
+        """
+        return self._by_br.get(br, [])
+
+    def of_type(self, link_type):
+        """
+        :param str link_type: a LinkType, as given in the topology config.
+        :returns: the Links of the given type.
+        """
+        return [self._links[link_id] for link_id in self._by_type.get(link_type.lower(), ())]
+
+    def __getitem__(self, link_id):
+        return self._links[link_id]
+
+    def __iter__(self):
+        return iter(self._links)
+
+    def __len__(self):
+        return len(self._links)
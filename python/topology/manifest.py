@@ -0,0 +1,220 @@
+# Copyright 2020 Anapaya Systems
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+:mod:`manifest` --- SCION topology output manifest
+==================================================
+"""
+# Stdlib
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+from collections import defaultdict
+
+# SCION
+from lib.defines import GEN_MANIFEST_FILE
+from lib.util import write_file
+from topology.common import json_default, TopoID
+
+# Crypto material is regenerated on every run, so it is not tracked by the manifest.
+CRYPTO_DIRS = ('certs', 'keys', 'customers')
+
+# Extracts the ISD-AS (in file format) from an element name, e.g. "br1-ff00_0_110-1_ctrl".
+_ELEM_IA_RE = re.compile(r"^[a-z_]+(\d+-[0-9a-f_]+)")
+
+
+class GenManifest(object):
+    """
+    Manifest of the generated output, used to regenerate a topology incrementally.
+
+    For every AS, the manifest records a digest of the inputs the AS subtree was rendered from,
+    and the hashes of the files generated below it. An AS whose inputs are unchanged and whose
+    files are still intact on disk is not rendered again.
+    """
+
+    def __init__(self, out_dir, fingerprint):
+        """
+        :param str out_dir: the output directory of the generator.
+        :param dict fingerprint: generator-wide inputs that affect every AS.
+        """
+        self.out_dir = out_dir
+        self.path = os.path.join(out_dir, GEN_MANIFEST_FILE)
+        self.fingerprint = fingerprint
+        self._prev = self._load()
+        self._inputs = {}
+        self._unchanged = set()
+        # The element dirs of the previous run, by changed AS.
+        self._prev_elem_dirs = {}
+        self._as_addrs = {}
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def check(self, topo_dicts, networks):
+        """
+        Digest the inputs of every AS and determine which AS subtrees are unchanged.
+
+        :param dict topo_dicts: The generated topo dicts from TopoGenerator.
+        :param dict networks: The generated networks from SubnetGenerator.
+        """
+        self.set_networks(networks)
+        for topo_id, as_topo in topo_dicts.items():
+            self.check_as(topo_id, as_topo)
+
+    def set_networks(self, networks):
+        """
+        Index the allocated addresses by AS, to be used by check_as.
+
+        :param dict networks: The generated networks from SubnetGenerator.
+        """
+        as_addrs = defaultdict(dict)
+        for net, elems in networks.items():
+            for elem, intf in elems.items():
+                m = _ELEM_IA_RE.match(elem)
+                if m:
+                    as_addrs[m.group(1)][elem] = str(intf)
+        self._as_addrs = as_addrs
+
+    def check_as(self, topo_id, as_topo):
+        """
+        Digest the inputs of a single AS and determine whether its subtree is unchanged.
+
+        :param TopoID topo_id: The AS.
+        :param dict as_topo: The topo dict of the AS.
+        """
+        digest = self._digest(as_topo, self._as_addrs.get(topo_id.file_fmt(), {}))
+        self._inputs[topo_id] = digest
+        prev = self._prev.get('ASes', {}).get(str(topo_id))
+        if prev and prev['Inputs'] == digest and self._intact(prev['Files']):
+            self._unchanged.add(topo_id)
+        elif prev:
+            # Elements may have been dropped from the AS, so it is rendered from scratch, and the
+            # dirs of the dropped elements are removed by write.
+            self._remove_files(prev['Files'])
+            self._prev_elem_dirs[topo_id] = _elem_dirs(prev['Files'], topo_id.base_dir(''))
+
+    def is_unchanged(self, topo_id):
+        """
+        Check whether the subtree of topo_id does not need to be rendered again.
+        """
+        return topo_id in self._unchanged
+
+    def write(self):
+        """
+        Hash the files generated for every AS and write the manifest.
+        """
+        if self._unchanged:
+            logging.info("Skipped %d unchanged ASes", len(self._unchanged))
+        self._remove_dropped()
+        ases = {}
+        for topo_id, digest in sorted(self._inputs.items()):
+            files = self._hash_tree(topo_id.base_dir(self.out_dir))
+            self._remove_dropped_elems(topo_id, files)
+            ases[str(topo_id)] = {
+                'Inputs': digest,
+                'Files': files,
+            }
+        write_file(self.path, json.dumps({'ASes': ases}, indent=2, sort_keys=True) + '\n')
+
+    def _remove_dropped(self):
+        """
+        Remove the subtrees of the ASes of the previous run that are no longer in the topology,
+        so that the output matches that of a clean run.
+        """
+        current = {str(topo_id) for topo_id in self._inputs}
+        for ia in self._prev.get('ASes', {}):
+            if ia in current:
+                continue
+            base = TopoID(ia).base_dir(self.out_dir)
+            logging.info("Removing dropped AS %s", ia)
+            shutil.rmtree(base, ignore_errors=True)
+            isd_dir = os.path.dirname(base)
+            if os.path.isdir(isd_dir) and not os.listdir(isd_dir):
+                os.rmdir(isd_dir)
+
+    def _remove_dropped_elems(self, topo_id, files):
+        """
+        Remove the element dirs of the previous run that no file was generated in, i.e. of the
+        elements dropped from the AS, including their crypto material.
+        """
+        prev_dirs = self._prev_elem_dirs.get(topo_id, ())
+        as_dir = topo_id.base_dir('')
+        for name in sorted(set(prev_dirs) - _elem_dirs(files, as_dir)):
+            logging.info("Removing dropped element %s of AS %s", name, topo_id)
+            shutil.rmtree(os.path.join(self.out_dir, as_dir, name), ignore_errors=True)
+
+    def _remove_files(self, files):
+        dirs = set()
+        for path in files:
+            path = os.path.join(self.out_dir, path)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            dirs.add(os.path.dirname(path))
+        for dir_ in sorted(dirs, reverse=True):
+            if os.path.isdir(dir_) and not os.listdir(dir_):
+                os.rmdir(dir_)
+
+    def _digest(self, as_topo, addrs):
+        inputs = {
+            'Args': self.fingerprint,
+            'Topo': as_topo,
+            'Addrs': addrs,
+        }
+        raw = json.dumps(inputs, default=json_default, sort_keys=True)
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def _intact(self, files):
+        for path, sha in files.items():
+            if _file_hash(os.path.join(self.out_dir, path)) != sha:
+                return False
+        return True
+
+    def _hash_tree(self, base):
+        files = {}
+        for dir_, subdirs, names in os.walk(base):
+            subdirs[:] = [d for d in subdirs if d not in CRYPTO_DIRS]
+            for name in names:
+                path = os.path.join(dir_, name)
+                files[os.path.relpath(path, self.out_dir)] = _file_hash(path)
+        return files
+
+
+def _elem_dirs(files, as_dir):
+    """
+    :param files: the paths of the files of an AS, relative to the output directory.
+    :param str as_dir: the directory of the AS, relative to the output directory.
+    :returns: the names of the subdirectories of the AS dir that contain any of the files.
+    """
+    dirs = set()
+    for path in files:
+        parts = os.path.relpath(path, as_dir).split(os.sep)
+        if len(parts) > 1:
+            dirs.add(parts[0])
+    return dirs
+
+
+def _file_hash(path):
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    except OSError:
+        return None
@@ -19,9 +19,10 @@
 # Stdlib
 import logging
 import math
+import re
 import sys
 from collections import defaultdict
-from ipaddress import ip_interface, ip_network
+from ipaddress import collapse_addresses, IPv4Address, IPv6Address, ip_network
 
 # External packages
 import yaml
@@ -34,6 +35,9 @@ DEFAULT_PRIV_NETWORK = "192.168.0.0/16"
 DEFAULT_SCN_DC_NETWORK = "172.20.0.0/20"
 DEFAULT_SCN_IN_D_NETWORK = "172.20.16.0/20"
 
+# The role of an element is the prefix of its name before the ISD-AS, e.g. "sd" or "tester_".
+_ROLE_RE = re.compile(r'[a-z_]*')
+
 
 class SubnetGenerator(object):
     def __init__(self, network, docker, in_docker):
@@ -52,6 +56,10 @@ class SubnetGenerator(object):
             logging.critical("Invalid network '%s'", network)
             sys.exit(1)
         self._subnets = defaultdict(lambda: AddressGenerator(self.docker))
+        # Free blocks of the address space, as lists of integer network addresses keyed by prefix
+        # length. The blocks are handed out like in a buddy allocator: a request is served from
+        # the most recently freed block of the smallest sufficient size, which is split, putting
+        # the unused halves back on the free lists.
         self._allocations = defaultdict(list)
         # Initialise the allocations with the supplied network, making sure to
         # exclude 127.0.0.0/30 (for v4) and DEFAULT6_NETWORK_ADDR/126 (for v6)
@@ -64,11 +72,16 @@ class SubnetGenerator(object):
         else:
             exclude = ip_network(DEFAULT6_NETWORK_ADDR + "/126")
 
+        base = int(self._net.network_address)
         if self._net.overlaps(exclude):
-            self._exclude_net(self._net, exclude)
+            if exclude.prefixlen <= self._net.prefixlen:
+                # The whole network is excluded.
+                return
+            self._split(base, self._net.prefixlen, int(exclude.network_address),
+                        exclude.prefixlen)
             return
 
-        self._allocations[self._net.prefixlen].append(self._net)
+        self._allocations[self._net.prefixlen].append(base)
 
     def register(self, location):
         return self._subnets[location]
@@ -96,43 +109,66 @@ class SubnetGenerator(object):
                     # No subnets available at this size
                     continue
                 alloc = self._allocations[prefix].pop()
-                # Carve out subnet of the required size
-                new_net = next(alloc.subnets(new_prefix=req_prefix))
-                new_net = _workaround_ip_network_hosts_py35(new_net)
-                logging.debug("Allocating %s from %s for subnet size %d" %
-                              (new_net, alloc, len(subnet)))
+                # Carve out the subnet of the required size from the start of the block, and
+                # repopulate the allocations list with the left-over space
+                self._split(alloc, prefix, alloc, req_prefix)
+                new_net = self._network(alloc, req_prefix)
+                logging.debug("Allocating %s from a /%d block for subnet size %d",
+                              new_net, prefix, len(subnet))
                 networks[new_net] = subnet.alloc_addrs(new_net)
-                # Repopulate the allocations list with the left-over space
-                self._exclude_net(alloc, new_net)
                 break
             else:
                 logging.critical("Unable to allocate /%d subnet" % req_prefix)
                 sys.exit(1)
         return networks
 
-    def _exclude_net(self, alloc, net):
-        for net in alloc.address_exclude(net):
-            self._allocations[net.prefixlen].append(net)
+    def _split(self, addr, prefix, sub_addr, sub_prefix):
+        """
+        Split the block addr/prefix down to the block sub_addr/sub_prefix it contains, and free
+        the other halves, largest first.
+        """
+        max_prefix = self._net.max_prefixlen
+        for p in range(prefix + 1, sub_prefix + 1):
+            size = 1 << (max_prefix - p)
+            if sub_addr & size:
+                self._allocations[p].append(addr)
+                addr += size
+            else:
+                self._allocations[p].append(addr + size)
+
+    def _network(self, addr, prefix):
+        return _workaround_ip_network_hosts_py35(ip_network((addr, prefix)))
 
 
 class AddressGenerator(object):
     def __init__(self, docker):
-        self._addrs = defaultdict(lambda: AddressProxy())
+        self._addrs = defaultdict(AddressProxy)
         self.docker = docker
 
     def register(self, id_):
         return self._addrs[id_]
 
     def alloc_addrs(self, subnet):
-        hosts = subnet.hosts()
-        interfaces = {}
+        """
+        Assign consecutive addresses from the subnet to the registered elements, in order of
+        their ids.
+
+        :param subnet: the ip_network allocated for the elements.
+        :returns: dict mapping the element ids to their AddressProxy.
+        """
+        # The first host address, as in subnet.hosts(): /31 and /32 (resp. /127 and /128)
+        # networks have no network address that has to be skipped.
+        addr = int(subnet.network_address)
+        if subnet.prefixlen < subnet.max_prefixlen - 1:
+            addr += 1
         # With the docker backend, docker itself claims the first ip of every network
         if self.docker:
-            next(hosts)
+            addr += 1
+        interfaces = {}
         for elem, proxy in sorted(self._addrs.items()):
-            intf = ip_interface("%s/%s" % (next(hosts), subnet.prefixlen))
-            interfaces[elem] = intf
-            proxy.set_intf(intf)
+            proxy.set_addr(addr, subnet.prefixlen, subnet.version)
+            interfaces[elem] = proxy
+            addr += 1
         return interfaces
 
     def __len__(self):
@@ -140,24 +176,87 @@ class AddressGenerator(object):
 
 
 class AddressProxy(yaml.YAMLObject):
+    """
+    The address of an element, stored as an integer together with the prefix length and IP
+    version of its subnet. The ipaddress objects and strings are only created when the address
+    is accessed, i.e. when it is serialised.
+    """
+    __slots__ = ('_addr', '_prefixlen', '_version')
     yaml_tag = ""
 
     def __init__(self):
-        self._intf = None
-        self.ip = None
+        self._addr = None
+        self._prefixlen = None
+        self._version = None
 
-    def set_intf(self, intf):
-        self._intf = intf
-        self.ip = self._intf.ip
+    def set_addr(self, addr, prefixlen, version):
+        """
+        :param int addr: the address.
+        :param int prefixlen: the prefix length of the subnet.
+        :param int version: the IP version, 4 or 6.
+        """
+        self._addr = addr
+        self._prefixlen = prefixlen
+        self._version = version
+
+    @property
+    def ip(self):
+        if self._addr is None:
+            return None
+        if self._version == 4:
+            return IPv4Address(self._addr)
+        return IPv6Address(self._addr)
 
     def __str__(self):
-        return str(self._intf)
+        return "%s/%d" % (self.ip, self._prefixlen)
 
     @classmethod
     def to_yaml(cls, dumper, inst):
         return dumper.represent_scalar('tag:yaml.org,2002:str', str(inst.ip))
 
 
+class ElementIndex(object):
+    """
+    Index of the allocated networks by element name, and of the element names by role, so that
+    the address of an element is found without scanning all networks.
+    """
+
+    def __init__(self, networks):
+        """
+        :param dict networks: the allocated networks, mapping every network to the elements in it
+            and their AddressProxy.
+        """
+        self._nets = defaultdict(list)
+        self._roles = defaultdict(list)
+        for net, elems in networks.items():
+            for elem, addr in elems.items():
+                nets = self._nets[elem]
+                if not nets:
+                    self._roles[_ROLE_RE.match(elem).group()].append(elem)
+                nets.append((net, addr))
+
+    def nets(self, elem):
+        """
+        :returns: the (network, AddressProxy) pairs of the element, in the order of the networks.
+        """
+        return self._nets.get(elem, [])
+
+    def ip(self, elem):
+        """
+        :returns: the address of the element in its first network, or None if it has none.
+        """
+        nets = self._nets.get(elem)
+        if not nets:
+            return None
+        return nets[0][1].ip
+
+    def elems(self, role):
+        """
+        :returns: the names of the elements with the given role, in the order of the networks.
+        """
+        return self._roles.get(role, [])
+
+
 class PortGenerator(object):
     def __init__(self):
         self.iter = iter(range(31000, 35000))
@@ -170,6 +269,23 @@ class PortGenerator(object):
         return p
 
 
+def aggregate_nets(nets):
+    """
+    Merge adjacent networks into the minimal list of prefixes that covers exactly the same
+    addresses.
+
+    :param nets: iterable of ip_networks, of either IP version.
+    :returns: the list of merged networks, the IPv4 ones first.
+    """
+    by_version = defaultdict(list)
+    for net in nets:
+        by_version[net.version].append(net)
+    aggs = []
+    for version in sorted(by_version):
+        aggs.extend(collapse_addresses(by_version[version]))
+    return aggs
+
+
 def socket_address_str(ip, port):
     if ip.version == 4:
         return "%s:%d" % (ip, port)
@@ -185,4 +301,6 @@ def _workaround_ip_network_hosts_py35(net):
     This regression is fixed in python 3.6.6 / 3.7.0.
     See https://bugs.python.org/issue27683
     """
+    if sys.version_info >= (3, 6, 6):
+        return net
     return ip_network('%s/%i' % (net.network_address, net.prefixlen))
@@ -0,0 +1,166 @@
+# Copyright 2020 Anapaya Systems
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+:mod:`profiling` --- SCION topology generator profiling
+=======================================================
+"""
+# Stdlib
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import resource
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# SCION
+from lib.defines import GEN_PROFILE_DIR, GEN_PROFILE_FILE
+from lib.util import write_file
+
+PROFILE_TIME = 'time'
+PROFILE_CPROFILE = 'cprofile'
+PROFILE_TRACEMALLOC = 'tracemalloc'
+PROFILE_MODES = (PROFILE_TIME, PROFILE_CPROFILE, PROFILE_TRACEMALLOC)
+
+# Number of functions, resp. allocation sites, listed per stage in the report.
+TOP_ENTRIES = 20
+
+
+class StageProfiler(object):
+    """
+    Records the wall time, CPU time, and the number and size of the files written, for every
+    stage of the generator. Depending on the mode, every stage is additionally run under cProfile
+    or tracemalloc.
+
+    The CPU time includes the worker processes that have terminated by the end of a stage. The
+    written files are determined by comparing the output directory before and after a stage, so
+    that files written by worker processes and by external tools are accounted for as well.
+    """
+
+    def __init__(self, out_dir, mode=None):
+        """
+        :param str out_dir: the output directory of the generator.
+        :param str mode: one of PROFILE_MODES, or None to disable profiling.
+        """
+        self.out_dir = out_dir
+        self.mode = mode
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Profile the enclosed code as the stage name.
+        """
+        if not self.mode:
+            yield
+            return
+        before = self._scan()
+        prof = None
+        if self.mode == PROFILE_CPROFILE:
+            prof = cProfile.Profile()
+        elif self.mode == PROFILE_TRACEMALLOC:
+            tracemalloc.start()
+        cpu = _cpu_time()
+        start = time.perf_counter()
+        if prof:
+            prof.enable()
+        try:
+            yield
+        finally:
+            if prof:
+                prof.disable()
+            entry = {
+                'Stage': name,
+                'WallTime': time.perf_counter() - start,
+                'CPUTime': _cpu_time() - cpu,
+            }
+            if self.mode == PROFILE_TRACEMALLOC:
+                entry.update(self._tracemalloc_stats())
+            entry.update(self._written(before, self._scan()))
+            if prof:
+                entry['Functions'] = self._cprofile_stats(name, prof)
+            self.stages.append(entry)
+            logging.info("Stage %s: %.3fs wall, %.3fs CPU, %d files written",
+                         name, entry['WallTime'], entry['CPUTime'], entry['Files'])
+
+    def write(self):
+        """
+        Write the report into the output directory.
+        """
+        if not self.mode:
+            return
+        report = {
+            'Mode': self.mode,
+            'WallTime': sum(s['WallTime'] for s in self.stages),
+            'Stages': self.stages,
+        }
+        write_file(os.path.join(self.out_dir, GEN_PROFILE_FILE),
+                   json.dumps(report, indent=2) + '\n')
+
+    def _scan(self):
+        files = {}
+        for dir_, _, names in os.walk(self.out_dir):
+            for name in names:
+                path = os.path.join(dir_, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files[path] = (st.st_ino, st.st_mtime_ns, st.st_size)
+        return files
+
+    def _written(self, before, after):
+        written = [st for path, st in after.items() if before.get(path) != st]
+        return {'Files': len(written), 'Bytes': sum(st[2] for st in written)}
+
+    def _cprofile_stats(self, name, prof):
+        path = os.path.join(self.out_dir, GEN_PROFILE_DIR, "%s.prof" % name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        prof.dump_stats(path)
+        stats = pstats.Stats(prof, stream=io.StringIO())
+        funcs = []
+        for func, (cc, nc, tt, ct, _) in stats.stats.items():
+            funcs.append({
+                'Function': "%s:%d(%s)" % func,
+                'Calls': nc,
+                'TotalTime': tt,
+                'CumulativeTime': ct,
+            })
+        funcs.sort(key=lambda f: f['CumulativeTime'], reverse=True)
+        return funcs[:TOP_ENTRIES]
+
+    def _tracemalloc_stats(self):
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        sites = []
+        for stat in snapshot.statistics('lineno')[:TOP_ENTRIES]:
+            frame = stat.traceback[0]
+            sites.append({
+                'Site': "%s:%d" % (frame.filename, frame.lineno),
+                'Bytes': stat.size,
+                'Blocks': stat.count,
+            })
+        return {'PeakTracedBytes': peak, 'Allocations': sites}
+
+
+def _cpu_time():
+    total = 0.0
+    for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+        usage = resource.getrusage(who)
+        total += usage.ru_utime + usage.ru_stime
+    return total
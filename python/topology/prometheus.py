@@ -17,11 +17,12 @@
 =============================================
 """
 # Stdlib
+import logging
 import os
+import re
+import sys
 from collections import defaultdict
-
-# External packages
-import yaml
+from functools import partial
 
 # SCION
 from lib.defines import DOCKER_COMPOSE_CONFIG_VERSION, PROM_FILE
@@ -31,8 +32,11 @@ from topology.common import (
     prom_addr_br,
     prom_addr_infra,
     prom_addr_dispatcher,
+    run_jobs,
     sciond_ip,
+    sciond_name,
 )
+from topology.serialize import dump_yaml
 
 CS_PROM_PORT = 30452
 SCIOND_PROM_PORT = 30455
@@ -42,6 +46,18 @@ DISP_PROM_PORT = 30441
 DEFAULT_BR_PROM_PORT = 30442
 
 PROM_DC_FILE = "prom-dc.yml"
+# The configs of the Prometheus shards, and the port the first shard listens on.
+PROM_SHARD_FILE = "prometheus-shard%d.yml"
+PROM_SHARD_BASE_PORT = 9090
+
+DEFAULT_SCRAPE_INTERVAL = '5s'
+# The key of the interval of all jobs, in the dict returned by scrape_intervals.
+GLOBAL_SCRAPE_INTERVAL = 'global'
+# The recording rules, and the window of the rates they record.
+PROM_RULES_FILE = "recording-rules.yml"
+RULES_RATE_WINDOW = '5m'
+# A Prometheus duration, e.g. 30s or 1m.
+_DURATION_RE = re.compile(r'^[0-9]+(ms|s|m|h|d|w|y)$')
 
 
 class PrometheusGenArgs(ArgsTopoDicts):
@@ -71,56 +87,215 @@ class PrometheusGenerator(object):
         """
         self.args = args
         self.output_base = os.environ.get('SCION_OUTPUT_BASE', os.getcwd())
+        self.targets_paths = defaultdict(list)
+        # The labelled target groups of all ASes by element type, in the consolidated mode.
+        self.target_groups = defaultdict(list)
+        # The recording rules of the BR metrics of every AS and link type.
+        self.link_rules = []
 
     def generate(self):
+        for topo_id, as_topo in self.args.topo_dicts.items():
+            self._add_link_rules(topo_id, as_topo)
+        if self.args.prom_consolidated:
+            for topo_id, as_topo in self.args.topo_dicts.items():
+                self._add_target_groups(topo_id, self._as_elem_targets(topo_id, as_topo))
+            self.generate_common()
+            return
         config_dict = {}
         for topo_id, as_topo in self.args.topo_dicts.items():
-            ele_dict = defaultdict(list)
-            for br_id, br_ele in as_topo["BorderRouters"].items():
-                ele_dict["BorderRouters"].append(prom_addr_br(br_id, br_ele, DEFAULT_BR_PROM_PORT))
-            for elem_id, elem in as_topo["ControlService"].items():
-                prom_addr = prom_addr_infra(self.args.docker, elem_id, elem, CS_PROM_PORT)
-                ele_dict["ControlService"].append(prom_addr)
-            if self.args.docker:
-                host_dispatcher = prom_addr_dispatcher(self.args.docker, topo_id,
-                                                       self.args.networks, DISP_PROM_PORT, "")
-                br_dispatcher = prom_addr_dispatcher(self.args.docker, topo_id,
-                                                     self.args.networks, DISP_PROM_PORT, "br")
-                ele_dict["Dispatcher"] = [host_dispatcher, br_dispatcher]
-            sd_prom_addr = '[%s]:%d' % (sciond_ip(self.args.docker, topo_id, self.args.networks),
-                                        SCIOND_PROM_PORT)
-            ele_dict["Sciond"].append(sd_prom_addr)
-            config_dict[topo_id] = ele_dict
-        self._write_config_files(config_dict)
+            config_dict[topo_id] = self._as_targets(topo_id, as_topo)
+        for topo_id, ele_dict in config_dict.items():
+            self._add_targets_paths(topo_id, ele_dict)
+        run_jobs(self.args.jobs, partial(self._write_as_config_files, config_dict), config_dict)
+        self.generate_common()
+
+    def generate_as(self, topo_id):
+        """
+        Generate the config of a single AS, for the streaming mode. The AS is added to the
+        global config written by generate_common.
+        """
+        self._add_link_rules(topo_id, self.args.topo_dicts[topo_id])
+        if self.args.prom_consolidated:
+            elem_targets = self._as_elem_targets(topo_id, self.args.topo_dicts[topo_id])
+            self._add_target_groups(topo_id, elem_targets)
+            return
+        ele_dict = self._as_targets(topo_id, self.args.topo_dicts[topo_id])
+        self._add_targets_paths(topo_id, ele_dict)
+        self._write_as_config_files({topo_id: ele_dict}, topo_id)
+
+    def generate_common(self):
+        targets_paths = self.targets_paths
+        if self.args.prom_consolidated:
+            targets_paths = self._write_target_groups()
+        if not self.args.docker:
+            targets_paths["dispatcher"] = [os.path.join("dispatcher", "prometheus", "disp.yml")]
+        rule_files = [self._write_rules_file()]
+        self._write_config_file(os.path.join(self.args.output_dir, PROM_FILE), targets_paths,
+                                rule_files=rule_files)
+        for shard in range(self._shards()):
+            # Every BR is scraped by exactly one shard, so the sums the shards record add up.
+            path = os.path.join(self.args.output_dir, PROM_SHARD_FILE % shard)
+            self._write_config_file(path, targets_paths, shard, rule_files)
         self._write_dc_file()
         self._write_disp_file()
 
-    def _write_config_files(self, config_dict):
+    def _shards(self):
+        # A single Prometheus uses the regular config.
+        return self.args.prom_shards if self.args.prom_shards > 1 else 0
+
+    def _as_targets(self, topo_id, as_topo):
+        ele_dict = defaultdict(list)
+        for ele_type, elem_targets in self._as_elem_targets(topo_id, as_topo).items():
+            ele_dict[ele_type] = [addr for _, addr in elem_targets]
+        return ele_dict
+
+    def _as_elem_targets(self, topo_id, as_topo):
+        """
+        :returns: dict mapping the element types to the (element, target address) pairs of the
+            AS.
+        """
+        ele_dict = defaultdict(list)
+        for br_id, br_ele in as_topo["BorderRouters"].items():
+            ele_dict["BorderRouters"].append(
+                (br_id, prom_addr_br(br_id, br_ele, DEFAULT_BR_PROM_PORT)))
+        for elem_id, elem in as_topo["ControlService"].items():
+            prom_addr = prom_addr_infra(self.args.docker, elem_id, elem, CS_PROM_PORT)
+            ele_dict["ControlService"].append((elem_id, prom_addr))
+        if self.args.docker:
+            host_dispatcher = prom_addr_dispatcher(self.args.docker, topo_id,
+                                                   self.args.elem_index, DISP_PROM_PORT, "")
+            br_dispatcher = prom_addr_dispatcher(self.args.docker, topo_id,
+                                                 self.args.elem_index, DISP_PROM_PORT, "br")
+            ele_dict["Dispatcher"] = [('disp%s' % topo_id.file_fmt(), host_dispatcher),
+                                      ('disp_br%s' % topo_id.file_fmt(), br_dispatcher)]
+        sd_prom_addr = '[%s]:%d' % (sciond_ip(self.args.docker, topo_id, self.args.elem_index),
+                                    SCIOND_PROM_PORT)
+        ele_dict["Sciond"].append((sciond_name(topo_id), sd_prom_addr))
+        return ele_dict
+
+    def _add_link_rules(self, topo_id, as_topo):
+        """
+        Add the rules recording the BR throughput and drop rates of the AS, per link type. The
+        rules select the series of the AS by the isd_as label of its targets, and those of a link
+        type by the IFIDs of its interfaces. Neither needs escaping in a PromQL string.
+        """
+        ifids = defaultdict(list)
+        for br_ele in as_topo["BorderRouters"].values():
+            for ifid, intf in br_ele['Interfaces'].items():
+                ifids[intf['LinkTo']].append(str(ifid))
+        for link_to, intf_ids in ifids.items():
+            intfs = '|'.join(sorted(intf_ids, key=int))
+            labels = {'isd_as': str(topo_id), 'link_to': link_to}
+            for record, metric, selector in (
+                    ('br_input_bytes', 'br_input_bytes_total', 'intf=~"%s"' % intfs),
+                    ('br_output_bytes', 'br_output_bytes_total', 'intf=~"%s"' % intfs),
+                    ('br_dropped_pkts', 'br_process_pkts_total',
+                     'intf_in=~"%s",intf_out="drop"' % intfs)):
+                self.link_rules.append({
+                    'record': 'isd_as_link_to:%s:rate%s' % (record, RULES_RATE_WINDOW),
+                    'expr': 'sum(rate(%s{job="BR",isd_as="%s",%s}[%s]))' % (
+                        metric, topo_id, selector, RULES_RATE_WINDOW),
+                    'labels': dict(labels),
+                })
+
+    def _write_rules_file(self):
+        """
+        Write the recording rules: the rates of every AS and link type, and their sums per AS and
+        per link type.
+
+        :returns: the path of the rules file, relative to the output directory.
+        """
+        aggregate_rules = []
+        for record in ('br_input_bytes', 'br_output_bytes', 'br_dropped_pkts'):
+            series = 'isd_as_link_to:%s:rate%s' % (record, RULES_RATE_WINDOW)
+            for by in ('isd_as', 'link_to'):
+                aggregate_rules.append({
+                    'record': '%s:%s:rate%s' % (by, record, RULES_RATE_WINDOW),
+                    'expr': 'sum by (%s) (%s)' % (by, series),
+                })
+        rules = {'groups': [
+            {'name': 'scion_br_links', 'rules': self.link_rules},
+            {'name': 'scion_br_aggregates', 'rules': aggregate_rules},
+        ]}
+        local_path = os.path.join(self.PROM_DIR, PROM_RULES_FILE)
+        write_file(os.path.join(self.args.output_dir, local_path),
+                   dump_yaml(rules))
+        return local_path
+
+    def _add_target_groups(self, topo_id, elem_targets):
+        for ele_type, targets in elem_targets.items():
+            for elem, addr in targets:
+                if addr is None:
+                    # Elements without a known address cannot be scraped.
+                    continue
+                self.target_groups[ele_type].append({
+                    'targets': [addr],
+                    'labels': {'isd_as': str(topo_id), 'element': elem},
+                })
+
+    def _write_target_groups(self):
+        """
+        Write one target file per element type, for the targets of all ASes.
+
+        :returns: dict mapping the job names to the paths of their target files.
+        """
         targets_paths = defaultdict(list)
-        for topo_id, ele_dict in config_dict.items():
-            base = topo_id.base_dir(self.args.output_dir)
-            as_local_targets_path = {}
-            for ele_type, target_list in ele_dict.items():
-                local_path = os.path.join(self.PROM_DIR, self.TARGET_FILES[ele_type])
-                targets_path = os.path.join(topo_id.base_dir(''), local_path)
-                targets_paths[self.JOB_NAMES[ele_type]].append(targets_path)
-                as_local_targets_path[self.JOB_NAMES[ele_type]] = [local_path]
-                self._write_target_file(base, target_list, ele_type)
-            self._write_config_file(os.path.join(base, PROM_FILE), as_local_targets_path)
-        if not self.args.docker:
-            targets_paths["dispatcher"] = [os.path.join("dispatcher", "prometheus", "disp.yml")]
-        self._write_config_file(os.path.join(self.args.output_dir, PROM_FILE), targets_paths)
+        for ele_type, groups in self.target_groups.items():
+            local_path = os.path.join(self.PROM_DIR, self.TARGET_FILES[ele_type])
+            write_file(os.path.join(self.args.output_dir, local_path),
+                       dump_yaml(groups))
+            targets_paths[self.JOB_NAMES[ele_type]].append(local_path)
+        return targets_paths
+
+    def _add_targets_paths(self, topo_id, ele_dict):
+        for ele_type in ele_dict:
+            local_path = os.path.join(self.PROM_DIR, self.TARGET_FILES[ele_type])
+            targets_path = os.path.join(topo_id.base_dir(''), local_path)
+            self.targets_paths[self.JOB_NAMES[ele_type]].append(targets_path)
+
+    def _write_as_config_files(self, config_dict, topo_id):
+        if self.args.manifest.is_unchanged(topo_id):
+            return
+        base = topo_id.base_dir(self.args.output_dir)
+        as_local_targets_path = {}
+        for ele_type, target_list in config_dict[topo_id].items():
+            local_path = os.path.join(self.PROM_DIR, self.TARGET_FILES[ele_type])
+            as_local_targets_path[self.JOB_NAMES[ele_type]] = [local_path]
+            self._write_target_file(base, target_list, ele_type, topo_id)
+        self._write_config_file(os.path.join(base, PROM_FILE), as_local_targets_path)
 
-    def _write_config_file(self, config_path, job_dict):
+    def _write_config_file(self, config_path, job_dict, shard=None, rule_files=None):
+        """
+        :param int shard: if set, only scrape the targets whose address hashes to this shard.
+        :param list rule_files: the rule files to load, if any.
+        """
+        intervals = self.args.scrape_intervals
         scrape_configs = []
         for job_name, file_paths in job_dict.items():
-            scrape_configs.append({
+            scrape_config = {
                 'job_name': job_name,
                 'file_sd_configs': [{'files': file_paths}],
-            })
+            }
+            if job_name in intervals:
+                scrape_config['scrape_interval'] = intervals[job_name]
+            if shard is not None:
+                scrape_config['relabel_configs'] = [
+                    {
+                        'source_labels': ['__address__'],
+                        'modulus': self.args.prom_shards,
+                        'target_label': '__tmp_hash',
+                        'action': 'hashmod',
+                    },
+                    {
+                        'source_labels': ['__tmp_hash'],
+                        'regex': '^%d$' % shard,
+                        'action': 'keep',
+                    },
+                ]
+            scrape_configs.append(scrape_config)
         config = {
             'global': {
-                'scrape_interval': '5s',
+                'scrape_interval': intervals[GLOBAL_SCRAPE_INTERVAL],
                 'evaluation_interval': '15s',
                 'external_labels': {
                     'monitor': 'scion-monitor'
@@ -128,12 +303,15 @@ class PrometheusGenerator(object):
             },
             'scrape_configs': scrape_configs,
         }
-        write_file(config_path, yaml.dump(config, default_flow_style=False))
+        if rule_files:
+            config['rule_files'] = rule_files
+        write_file(config_path, dump_yaml(config))
 
-    def _write_target_file(self, base_path, target_addrs, ele_type):
+    def _write_target_file(self, base_path, target_addrs, ele_type, topo_id):
         targets_path = os.path.join(base_path, self.PROM_DIR, self.TARGET_FILES[ele_type])
-        target_config = [{'targets': target_addrs}]
-        write_file(targets_path, yaml.dump(target_config, default_flow_style=False))
+        # The isd_as label is what the recording rules select the BRs of the AS by.
+        target_config = [{'targets': target_addrs, 'labels': {'isd_as': str(topo_id)}}]
+        write_file(targets_path, dump_yaml(target_config))
 
     def _write_disp_file(self):
         if self.args.docker:
@@ -142,24 +320,61 @@ class PrometheusGenerator(object):
                                     PrometheusGenerator.PROM_DIR, "disp.yml")
         target_config = [{'targets': [prom_addr_dispatcher(False, None, None,
                                                            DISP_PROM_PORT, None)]}]
-        write_file(targets_path, yaml.dump(target_config, default_flow_style=False))
+        write_file(targets_path, dump_yaml(target_config))
 
     def _write_dc_file(self):
         name_prefix = 'prometheus'
-        name = '%s_docker' % name_prefix if self.args.in_docker else name_prefix
+        services = {}
+        if not self._shards():
+            services[name_prefix] = self._dc_service(name_prefix, PROM_FILE)
+        for shard in range(self._shards()):
+            service = self._dc_service('%s_shard%d' % (name_prefix, shard),
+                                       PROM_SHARD_FILE % shard)
+            # All shards share the host network.
+            service['command'] += ['--web.listen-address', ':%d' % (PROM_SHARD_BASE_PORT + shard)]
+            services['%s_shard%d' % (name_prefix, shard)] = service
         prom_dc = {
             'version': DOCKER_COMPOSE_CONFIG_VERSION,
-            'services': {
-                name_prefix: {
-                    'image': 'prom/prometheus:v2.6.0',
-                    'container_name': name,
-                    'network_mode': 'host',
-                    'volumes': [
-                        self.output_base + '/gen:/prom-config:ro'
-                    ],
-                    'command': ['--config.file', '/prom-config/prometheus.yml'],
-                }
-            }
+            'services': services,
         }
         write_file(os.path.join(self.args.output_dir, PROM_DC_FILE),
-                   yaml.dump(prom_dc, default_flow_style=False))
+                   dump_yaml(prom_dc))
+
+    def _dc_service(self, name, config_file):
+        return {
+            'image': 'prom/prometheus:v2.6.0',
+            'container_name': '%s_docker' % name if self.args.in_docker else name,
+            'network_mode': 'host',
+            'volumes': [
+                self.output_base + '/gen:/prom-config:ro'
+            ],
+            'command': ['--config.file', '/prom-config/%s' % config_file],
+        }
+
+
+def scrape_intervals(defaults, overrides):
+    """
+    Resolve the scrape intervals of the Prometheus jobs.
+
+    :param dict defaults: the prometheus section of the defaults in the topology config, with the
+        optional scrape_interval of all jobs, and the optional job_scrape_intervals by job name.
+    :param list overrides: '[JOB=]INTERVAL' strings from the command line, applied in order.
+    :returns: dict mapping GLOBAL_SCRAPE_INTERVAL to the interval of all jobs, and every job
+        with a different interval to its interval.
+    """
+    jobs = set(PrometheusGenerator.JOB_NAMES.values())
+    intervals = {GLOBAL_SCRAPE_INTERVAL: defaults.get('scrape_interval', DEFAULT_SCRAPE_INTERVAL)}
+    intervals.update(defaults.get('job_scrape_intervals', {}))
+    for override in overrides:
+        job, _, interval = override.rpartition('=')
+        intervals[job or GLOBAL_SCRAPE_INTERVAL] = interval
+    for job, interval in intervals.items():
+        if job != GLOBAL_SCRAPE_INTERVAL and job not in jobs:
+            logging.critical("Unknown Prometheus job '%s', expected one of: %s",
+                             job, ", ".join(sorted(jobs)))
+            sys.exit(1)
+        if not _DURATION_RE.match(str(interval)):
+            logging.critical("Invalid scrape interval '%s' of Prometheus job '%s'",
+                             interval, job)
+            sys.exit(1)
+    return intervals
@@ -0,0 +1,164 @@
+# Copyright 2020 Anapaya Systems
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+:mod:`serialize` --- SCION topology config serialisation
+========================================================
+
+The generated configs are serialised through the dump functions of this module, which use the
+fastest available implementation of every format:
+
+- YAML with the libyaml based CSafeDumper, if PyYAML was built with libyaml.
+- TOML with a writer for config dicts of tables and scalars, which produces the same output as
+  toml.dumps, and falls back to it for anything else.
+- JSON with the C encoder of the json module in the compact mode, which the indented mode does
+  not use.
+"""
+# Stdlib
+import json
+import re
+
+# External packages
+import toml
+import yaml
+
+# The libyaml based dumper, or the pure Python one if PyYAML was built without libyaml.
+YAML_DUMPER = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+
+JSON_INDENT = 2
+JSON_COMPACT_SEPARATORS = (',', ':')
+
+_TOML_ENCODER = toml.TomlEncoder()
+# Keys that toml does not quote.
+_TOML_BARE_KEY_RE = re.compile(r'[A-Za-z0-9_-]+\Z')
+# Strings that toml quotes without escaping anything: printable ASCII, except '"' and '\'.
+_TOML_PLAIN_STR_RE = re.compile(r'[ !#-\[\]-~]*\Z')
+# The placeholder of a per-element field in a TOMLTemplate.
+_TOML_FIELD = '{{%s}}'
+_TOML_FIELD_RE = re.compile(r'\{\{(\w+)\}\}')
+
+
+class _TOMLUnsupported(Exception):
+    """
+    The value needs the full toml encoder.
+    """
+
+
+def dump_yaml(data):
+    """
+    :param data: the plain data (dicts, lists, strings and numbers) to serialise.
+    :returns: data as block style YAML, with sorted keys.
+    """
+    return yaml.dump(data, Dumper=YAML_DUMPER, default_flow_style=False)
+
+
+def dump_json(data, default=None, compact=False):
+    """
+    :param data: the data to serialise.
+    :param default: the json default function, for the values json can not serialise.
+    :param bool compact: whether to write the JSON on a single line, without whitespace.
+    :returns: data as JSON, indented by JSON_INDENT unless compact.
+    """
+    if compact:
+        return json.dumps(data, default=default, separators=JSON_COMPACT_SEPARATORS)
+    return json.dumps(data, default=default, indent=JSON_INDENT)
+
+
+def dump_toml(data):
+    """
+    :param dict data: the config dict to serialise.
+    :returns: data as TOML, as written by toml.dumps.
+    """
+    try:
+        ret, tables = _toml_table(data)
+        while tables:
+            # Like toml, write the tables one nesting level after the other.
+            nested = {}
+            for name, table in tables.items():
+                body, subtables = _toml_table(table)
+                if body or not subtables:
+                    if ret and ret[-2:] != "\n\n":
+                        ret += "\n"
+                    ret += "[" + name + "]\n" + body
+                for subname, subtable in subtables.items():
+                    nested[name + "." + subname] = subtable
+            tables = nested
+    except _TOMLUnsupported:
+        return toml.dumps(data)
+    return ret
+
+
+def _toml_table(table):
+    """
+    :returns: the key/value lines of the scalars and lists in table, and the dict of its tables
+        by their (quoted) keys.
+    """
+    lines = []
+    tables = {}
+    for key, value in table.items():
+        key = str(key)
+        if not _TOML_BARE_KEY_RE.match(key):
+            key = _TOML_ENCODER.dump_value(key)
+        if isinstance(value, dict):
+            tables[key] = value
+        elif value is not None:
+            lines.append("%s = %s\n" % (key, _toml_value(value)))
+    return "".join(lines), tables
+
+
+def _toml_value(value):
+    value_type = type(value)
+    if value_type is str and _TOML_PLAIN_STR_RE.match(value):
+        return '"' + value + '"'
+    if value_type is bool:
+        return 'true' if value else 'false'
+    if value_type is int:
+        return str(value)
+    if isinstance(value, list) and any(isinstance(v, dict) for v in value):
+        # An array of tables.
+        raise _TOMLUnsupported()
+    return str(_TOML_ENCODER.dump_value(value))
+
+
+class TOMLTemplate(object):
+    """
+    The TOML config of a role, serialised once with placeholders for the string fields that
+    differ between the elements. The config of an element is rendered by substituting its fields
+    into the serialised text, instead of building and serialising the whole config dict.
+
+    Fields that are not plain strings (i.e. that toml would escape, or leave out if None) are
+    rendered by building and serialising the config of the element.
+    """
+
+    def __init__(self, build, fields):
+        """
+        :param build: function returning the config dict, given the fields as keyword arguments.
+            The structure of the config must not depend on the values of the fields.
+        :param tuple fields: the names of the per-element fields.
+        """
+        self._build = build
+        text = dump_toml(build(**{field: _TOML_FIELD % field for field in fields}))
+        # The text between the fields, with the names of the fields at the odd indices.
+        self._parts = _TOML_FIELD_RE.split(text)
+
+    def render(self, **fields):
+        """
+        :returns: the config with the given fields, as TOML.
+        """
+        parts = list(self._parts)
+        for i in range(1, len(parts), 2):
+            value = fields[parts[i]]
+            if type(value) is not str or not _TOML_PLAIN_STR_RE.match(value):
+                return dump_toml(self._build(**fields))
+            parts[i] = value
+        return "".join(parts)
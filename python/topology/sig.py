@@ -14,23 +14,22 @@
 # limitations under the License.
 
 # Stdlib
-import json
 import os
-# External packages
-import toml
 # SCION
 from lib.util import write_file
 from topology.common import (
     ArgsBase,
     DOCKER_USR_VOL,
     json_default,
-    remote_nets,
     sciond_svc_name,
     SD_API_PORT,
-    SIG_CONFIG_NAME
+    SIG_CONFIG_NAME,
+    SIG_REMOTE_NETS_FILE,
+    write_remote_nets,
 )
 from topology.net import socket_address_str
 from topology.prometheus import SIG_PROM_PORT
+from topology.serialize import dump_json, dump_toml
 
 
 class SIGGenArgs(ArgsBase):
@@ -59,6 +58,8 @@ class SIGGenerator(object):
         self.prefix = 'docker_' if self.args.in_docker else ''
 
     def generate(self):
+        write_remote_nets(self.args.sig_nets,
+                          os.path.join(self.args.output_dir, SIG_REMOTE_NETS_FILE))
         for topo_id, topo in self.args.topo_dicts.items():
             base = os.path.join(
                 self.output_base, topo_id.base_dir(self.args.output_dir))
@@ -112,24 +113,23 @@ class SIGGenerator(object):
                 self._disp_vol(topo_id),
                 '/dev/net/tun:/dev/net/tun',
                 '%s/sig%s:/share/conf' % (base, topo_id.file_fmt()),
-                self._logs_vol()
+                self._logs_vol(),
+                self._remote_nets_vol(),
             ],
             'network_mode': 'service:scion_disp_sig_%s' % topo_id.file_fmt(),
-            'command': [remote_nets(self.args.networks, topo_id)]
+            'command': ['/share/%s' % SIG_REMOTE_NETS_FILE, str(topo_id)]
         }
 
     def _sig_json(self, topo_id):
         sig_cfg = {"ConfigVersion": 1, "ASes": {}}
-        for t_id, topo in self.args.topo_dicts.items():
+        for t_id in self.args.topo_dicts:
             if topo_id == t_id:
                 continue
-            sig_cfg['ASes'][str(t_id)] = {"Nets": []}
-            net = self.args.networks['sig%s' % t_id.file_fmt()][0]
-            sig_cfg['ASes'][str(t_id)]['Nets'].append(net['net'])
+            sig_cfg['ASes'][str(t_id)] = {"Nets": [self.args.sig_nets[t_id]]}
 
         cfg = os.path.join(topo_id.base_dir(self.args.output_dir), 'sig%s' % topo_id.file_fmt(),
                            "cfg.json")
-        contents_json = json.dumps(sig_cfg, default=json_default, indent=2)
+        contents_json = dump_json(sig_cfg, json_default)
         write_file(cfg, contents_json + '\n')
 
     def _sig_toml(self, topo_id, topo):
@@ -170,10 +170,14 @@ class SIGGenerator(object):
             }
         }
         path = os.path.join(topo_id.base_dir(self.args.output_dir), name, SIG_CONFIG_NAME)
-        write_file(path, toml.dumps(sig_conf))
+        write_file(path, dump_toml(sig_conf))
 
     def _disp_vol(self, topo_id):
         return 'vol_scion_%sdisp_sig_%s:/run/shm/dispatcher:rw' % (self.prefix, topo_id.file_fmt())
 
     def _logs_vol(self):
         return self.output_base + '/logs:/share/logs:rw'
+
+    def _remote_nets_vol(self):
+        path = os.path.join(self.output_base, self.args.output_dir, SIG_REMOTE_NETS_FILE)
+        return '%s:/share/%s:ro' % (path, SIG_REMOTE_NETS_FILE)
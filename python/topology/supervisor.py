@@ -29,6 +29,7 @@ from topology.common import (
     COMMON_DIR,
     CS_CONFIG_NAME,
     DISP_CONFIG_NAME,
+    run_jobs,
     SD_CONFIG_NAME,
 )
 
@@ -48,11 +49,18 @@ class SupervisorGenerator(object):
         self.args = args
 
     def generate(self):
+        self.generate_common()
+        run_jobs(self.args.jobs, self.generate_as, self.args.topo_dicts)
+
+    def generate_common(self):
         self._write_dispatcher_conf()
-        for topo_id, topo in self.args.topo_dicts.items():
-            base = topo_id.base_dir(self.args.output_dir)
-            entries = self._as_conf(topo, base)
-            self._write_as_conf(topo_id, entries)
+
+    def generate_as(self, topo_id):
+        if self.args.manifest.is_unchanged(topo_id):
+            return
+        base = topo_id.base_dir(self.args.output_dir)
+        entries = self._as_conf(self.args.topo_dicts[topo_id], base)
+        self._write_as_conf(topo_id, entries)
 
     def _as_conf(self, topo, base):
         entries = []
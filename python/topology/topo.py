@@ -17,15 +17,13 @@
 =============================================
 """
 # Stdlib
-import json
 import logging
 import os
 import random
 import sys
+from array import array
 from collections import defaultdict
-
-# External packages
-import yaml
+from collections.abc import Mapping
 
 # SCION
 from lib.defines import (
@@ -36,19 +34,30 @@ from lib.defines import (
     SCION_ROUTER_PORT,
     TOPO_FILE,
 )
+from lib.scion_addr import format_isd_as_list
 from lib.types import LinkType
-from lib.util import write_file
+from lib.util import link_file, symlink_file, write_file
 from topology.common import (
     ArgsBase,
+    COMMON_DIR,
     json_default,
     SCION_SERVICE_NAMES,
     srv_iter,
     TopoID
 )
+from topology.links import LinkGraph
 from topology.net import PortGenerator
+from topology.serialize import dump_json, dump_yaml
 
 DEFAULT_LINK_BW = 1000
 
+# How the topology.json of an AS is written into the directories of its elements: as a copy per
+# element, or written once into the common dir and hard or symbolically linked.
+TOPO_FILES_COPY = 'copy'
+TOPO_FILES_HARDLINK = 'hardlink'
+TOPO_FILES_SYMLINK = 'symlink'
+TOPO_FILES_MODES = (TOPO_FILES_COPY, TOPO_FILES_HARDLINK, TOPO_FILES_SYMLINK)
+
 DEFAULT_BEACON_SERVERS = 1
 DEFAULT_GRACE_PERIOD = 18000
 DEFAULT_CONTROL_SERVERS = 1
@@ -60,6 +69,9 @@ DEFAULT_UNDERLAY = UNDERLAY_4
 ADDR_TYPE_4 = 'IPv4'
 ADDR_TYPE_6 = 'IPv6'
 
+MIN_IFID = 1
+MAX_IFID = 4095
+
 
 class TopoGenArgs(ArgsBase):
     def __init__(self, args, topo_config, subnet_gen4, subnet_gen6, default_mtu):
@@ -89,27 +101,52 @@ class TopoGenerator(object):
         self.topo_dicts = {}
         self.hosts = []
         self.virt_addrs = set()
-        self.as_list = defaultdict(list)
-        self.links = defaultdict(list)
-        self.ifid_map = {}
+        # The ASes of as_list.yml, as packed ISD-AS ints, by Core/Non-core.
+        self.as_list = defaultdict(lambda: array('Q'))
+        self.links = LinkGraph()
+        self.rnd = random
+        if self.args.seed is not None:
+            self.rnd = random.Random(self.args.seed)
 
     def _reg_addr(self, topo_id, elem_id, addr_type):
         subnet = self.args.subnet_gen[addr_type].register(topo_id)
         return subnet.register(elem_id)
 
-    def _reg_link_addrs(self, local_br, remote_br, local_ifid, remote_ifid, addr_type):
-        link_name = str(sorted((local_br, remote_br)))
-        link_name += str(sorted((local_ifid, remote_ifid)))
-        subnet = self.args.subnet_gen[addr_type].register(link_name)
-        return subnet.register(local_br), subnet.register(remote_br)
+    def _reg_link_addrs(self, end, addr_type):
+        subnet = self.args.subnet_gen[addr_type].register(end.link.subnet)
+        return subnet.register(end.br), subnet.register(end.remote_br)
 
     def _iterate(self, f):
         for isd_as, as_conf in self.args.topo_config_dict["ASes"].items():
             f(TopoID(isd_as), as_conf)
 
     def generate(self):
+        networks = self._alloc_addrs(self._generate_as_topo)
+        self.args.manifest.check(self.topo_dicts, networks)
+        self._write_as_topos()
+        return self.topo_dicts, networks
+
+    def stream(self):
+        """
+        Streaming variant of generate, which does not keep the topologies of all ASes in memory.
+
+        All addresses are registered and allocated up front, discarding the topology of every AS
+        right after it is built. The topologies are then built again, one AS at a time: the
+        registrations are idempotent, so they resolve to the addresses allocated before.
+
+        :returns: the networks, and an iterator over (topo_id, as_topo). The topology.json files
+            of an AS are written before it is yielded.
+        """
+        networks = self._alloc_addrs(self._register_as_topo)
+        self.args.manifest.set_networks(networks)
+        return networks, self._stream_as_topos()
+
+    def topo_ids(self):
+        return [TopoID(isd_as) for isd_as in self.args.topo_config_dict["ASes"]]
+
+    def _alloc_addrs(self, gen_as_topo):
         self._read_links()
-        self._iterate(self._generate_as_topo)
+        self._iterate(gen_as_topo)
         self._iterate(self._generate_as_list)
         if self.args.sig:
             self._iterate(self._register_sig)
@@ -119,10 +156,22 @@ class TopoGenerator(object):
             networks[k] = v
         for k, v in self.args.subnet_gen[ADDR_TYPE_6].alloc_subnets().items():
             networks[k] = v
-        self._write_as_topos()
         self._write_as_list()
         self._write_ifids()
-        return self.topo_dicts, networks
+        return networks
+
+    def _register_as_topo(self, topo_id, as_conf):
+        self._generate_as_topo(topo_id, as_conf)
+        del self.topo_dicts[topo_id]
+
+    def _stream_as_topos(self):
+        for isd_as, as_conf in self.args.topo_config_dict["ASes"].items():
+            topo_id = TopoID(isd_as)
+            self._generate_as_topo(topo_id, as_conf)
+            as_topo = self.topo_dicts.pop(topo_id)
+            self.args.manifest.check_as(topo_id, as_topo)
+            self._write_as_topo(topo_id, as_topo)
+            yield topo_id, as_topo
 
     def _register_sig(self, topo_id, as_conf):
         addr_type = addr_type_from_underlay(as_conf.get('underlay', DEFAULT_UNDERLAY))
@@ -150,17 +199,20 @@ class TopoGenerator(object):
             br_ids[ep] += 1
             br_id = br_ids[ep]
         br = "br%s-%d" % (ep.file_fmt(), br_id)
+        ifid_gen = if_ids.get(ep)
+        if ifid_gen is None:
+            if_ids[ep] = ifid_gen = IFIDGenerator(str(ep), self.rnd)
         ifid = ep.ifid
         if self.args.random_ifids or not ifid:
-            ifid = if_ids[ep].new()
+            ifid = ifid_gen.new()
         else:
-            if_ids[ep].add(ifid)
+            ifid_gen.add(ifid)
         return br, ifid
 
     def _read_links(self):
         assigned_br_id = {}
         br_ids = defaultdict(int)
-        if_ids = defaultdict(lambda: IFIDGenerator())
+        if_ids = {}
         if not self.args.topo_config_dict.get("links", None):
             return
         for attrs in self.args.topo_config_dict["links"]:
@@ -172,14 +224,7 @@ class TopoGenerator(object):
                 linkto_b = LinkType.CHILD
             a_br, a_ifid = self._br_name(a, assigned_br_id, br_ids, if_ids)
             b_br, b_ifid = self._br_name(b, assigned_br_id, br_ids, if_ids)
-            self.links[a].append((linkto_b, b, attrs, a_br, b_br, a_ifid, b_ifid))
-            self.links[b].append((linkto_a, a, attrs, b_br, a_br, b_ifid, a_ifid))
-            a_desc = "%s %s" % (a_br, a_ifid)
-            b_desc = "%s %s" % (b_br, b_ifid)
-            self.ifid_map.setdefault(str(a), {})
-            self.ifid_map[str(a)][a_desc] = b_desc
-            self.ifid_map.setdefault(str(b), {})
-            self.ifid_map[str(b)][b_desc] = a_desc
+            self.links.add(a, b, linkto, linkto_a, linkto_b, attrs, a_br, b_br, a_ifid, b_ifid)
 
     def _generate_as_topo(self, topo_id, as_conf):
         mtu = as_conf.get('mtu', self.args.default_mtu)
@@ -250,15 +295,14 @@ class TopoGenerator(object):
 
     def _gen_br_entries(self, topo_id, as_conf):
         addr_type = addr_type_from_underlay(as_conf.get('underlay', DEFAULT_UNDERLAY))
-        for (linkto, remote, attrs, l_br, r_br, l_ifid, r_ifid) in self.links[topo_id]:
-            self._gen_br_entry(topo_id, l_ifid, remote, r_ifid,
-                               linkto, attrs, l_br, r_br, addr_type)
+        for end in self.links.ends(topo_id):
+            self._gen_br_entry(topo_id, end, addr_type)
 
-    def _gen_br_entry(self, local, l_ifid, remote, r_ifid, remote_type, attrs,
-                      local_br, remote_br, addr_type):
+    def _gen_br_entry(self, local, end, addr_type):
+        local_br, l_ifid, remote, remote_type = end.br, end.ifid, end.remote, end.remote_type
+        attrs = end.attrs
         link_addr_type = addr_type_from_underlay(attrs.get('underlay', DEFAULT_UNDERLAY))
-        public_addr, remote_addr = self._reg_link_addrs(local_br, remote_br, l_ifid,
-                                                        r_ifid, link_addr_type)
+        public_addr, remote_addr = self._reg_link_addrs(end, link_addr_type)
 
         ctrl_addr = int_addr = self._reg_addr(local, local_br + "_ctrl", addr_type)
         if self.args.docker:
@@ -338,27 +382,78 @@ class TopoGenerator(object):
             key = "Core"
         else:
             key = "Non-core"
-        self.as_list[key].append(str(topo_id))
+        self.as_list[key].append(topo_id.int())
 
     def _write_as_topos(self):
-        for topo_id, as_topo, base in srv_iter(
-                self.topo_dicts, self.args.output_dir, common=True):
-            path = os.path.join(base, TOPO_FILE)
-            contents_json = json.dumps(self.topo_dicts[topo_id],
-                                       default=json_default, indent=2)
-            write_file(path, contents_json + '\n')
+        for topo_id, as_topo in self.topo_dicts.items():
+            self._write_as_topo(topo_id, as_topo)
+
+    def _write_as_topo(self, topo_id, as_topo):
+        if self.args.manifest.is_unchanged(topo_id):
+            return
+        contents_json = dump_json(as_topo, json_default, self.args.compact_json)
+        if self.args.topo_files == TOPO_FILES_COPY:
+            for _, _, base in srv_iter({topo_id: as_topo}, self.args.output_dir, common=True):
+                path = os.path.join(base, TOPO_FILE)
+                if os.path.islink(path):
+                    # Left over from a previous run with --topo-files symlink.
+                    os.remove(path)
+                write_file(path, contents_json + '\n')
+            return
+        common_path = os.path.join(topo_id.base_dir(self.args.output_dir), COMMON_DIR, TOPO_FILE)
+        write_file(common_path, contents_json + '\n')
+        link = symlink_file if self.args.topo_files == TOPO_FILES_SYMLINK else link_file
+        for _, _, base in srv_iter({topo_id: as_topo}, self.args.output_dir):
+            os.makedirs(base, exist_ok=True)
+            link(common_path, os.path.join(base, TOPO_FILE))
 
     def _write_as_list(self):
         list_path = os.path.join(self.args.output_dir, AS_LIST_FILE)
-        write_file(list_path, yaml.dump(dict(self.as_list)))
+        as_list = {k: format_isd_as_list(v) for k, v in self.as_list.items()}
+        write_file(list_path, dump_yaml(as_list))
 
     def _write_ifids(self):
+        ifid_map = {}
+        for link in self.links:
+            a_desc = "%s %s" % (link.a_br, link.a_ifid)
+            b_desc = "%s %s" % (link.b_br, link.b_ifid)
+            ifid_map.setdefault(str(link.a), {})[a_desc] = b_desc
+            ifid_map.setdefault(str(link.b), {})[b_desc] = a_desc
         list_path = os.path.join(self.args.output_dir, IFIDS_FILE)
-        write_file(list_path, yaml.dump(self.ifid_map,
-                                        default_flow_style=False))
+        write_file(list_path, dump_yaml(ifid_map))
+
+
+class ASTopoWindow(Mapping):
+    """
+    Stand-in for the topo dicts in the streaming mode. It lists every AS, but only holds the
+    topology of the AS that is currently being generated.
+    """
+
+    def __init__(self, topo_ids):
+        self._topo_ids = topo_ids
+        self._topo_id = None
+        self._as_topo = None
+
+    def set(self, topo_id, as_topo):
+        self._topo_id = topo_id
+        self._as_topo = as_topo
+
+    def __getitem__(self, topo_id):
+        if topo_id != self._topo_id:
+            raise KeyError("Topology of %s is not in the window" % topo_id)
+        return self._as_topo
+
+    def __iter__(self):
+        return iter(self._topo_ids)
+
+    def __len__(self):
+        return len(self._topo_ids)
 
 
 class LinkEP(TopoID):
+    # Link endpoints carry the interface and BR of the link, they are not shared.
+    INTERN = False
+
     def __init__(self, raw):
         self._brid = None
         self.ifid = None
@@ -380,27 +475,56 @@ class LinkEP(TopoID):
 
 
 class IFIDGenerator(object):
-    """Generates unique interface IDs"""
+    """
+    Generates unique interface IDs.
 
-    def __init__(self):
-        self._ifids = set()
+    Random IFIDs are drawn without replacement, by running a Fisher-Yates shuffle of all valid
+    IFIDs lazily: the first _count positions of the permutation hold the IFIDs in use, the
+    remaining positions the free ones. Only the positions that were swapped are stored, so both
+    new and add take constant time and memory, however full the AS gets.
+    """
+
+    def __init__(self, owner, rnd=random):
+        """
+        :param str owner: the AS the IFIDs are allocated in, for error reporting.
+        :param random.Random rnd: the source of the random IFIDs.
+        """
+        self._owner = owner
+        self._rnd = rnd
+        self._count = 0
+        # The IFID at each position, resp. the position of each IFID, where it differs from the
+        # initial order: IFID i at position i - MIN_IFID.
+        self._ifid_at = {}
+        self._pos_of = {}
 
     def new(self):
-        while True:
-            ifid = random.randrange(1, 4096)
-            if ifid in self._ifids:
-                continue
-            self.add(ifid)
-            return ifid
+        if self._count == MAX_IFID - MIN_IFID + 1:
+            logging.critical("All %d IFIDs of %s are in use!" % (self._count, self._owner))
+            exit(1)
+        pos = self._rnd.randrange(self._count, MAX_IFID - MIN_IFID + 1)
+        ifid = self._ifid_at.get(pos, pos + MIN_IFID)
+        self._take(ifid, pos)
+        return ifid
 
     def add(self, ifid):
-        if ifid in self._ifids:
-            logging.critical("IFID %d already exists!" % ifid)
-            exit(1)
-        if ifid < 1 or ifid > 4095:
+        if ifid < MIN_IFID or ifid > MAX_IFID:
             logging.critical("IFID %d is invalid!" % ifid)
             exit(1)
-        self._ifids.add(ifid)
+        pos = self._pos_of.get(ifid, ifid - MIN_IFID)
+        if pos < self._count:
+            logging.critical("IFID %d already exists!" % ifid)
+            exit(1)
+        self._take(ifid, pos)
+
+    def _take(self, ifid, pos):
+        # Swap the IFID at pos with the first free one, and mark it as used.
+        first = self._count
+        first_ifid = self._ifid_at.get(first, first + MIN_IFID)
+        self._ifid_at[pos] = first_ifid
+        self._pos_of[first_ifid] = pos
+        self._ifid_at[first] = ifid
+        self._pos_of[ifid] = first
+        self._count += 1
 
 
 def addr_type_from_underlay(underlay: str) -> str:
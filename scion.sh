@@ -17,12 +17,22 @@ cmd_topo_clean() {
     supervisor/supervisor.sh shutdown
     stop_jaeger
     mkdir -p logs traces gen gen-cache
-    find gen gen-cache -mindepth 1 -maxdepth 1 -exec rm -r {} +
+    if [ "$1" = "keep-gen" ]; then
+        # The generator updates gen/ incrementally, using the manifest of the previous run.
+        find gen-cache -mindepth 1 -maxdepth 1 -exec rm -r {} +
+    else
+        find gen gen-cache -mindepth 1 -maxdepth 1 -exec rm -r {} +
+    fi
 }
 
 cmd_topology() {
     set -e
-    cmd_topo_clean
+    if [ "$1" = "--incremental" ]; then
+        shift
+        cmd_topo_clean keep-gen
+    else
+        cmd_topo_clean
+    fi
 
     # Build the necessary binaries.
     bazel build //:scion-topo
@@ -410,9 +420,11 @@ cmd_help() {
 	echo
 	cat <<-_EOF
 	Usage:
-	    $PROGRAM topology
+	    $PROGRAM topology [--incremental]
 	        Create topology, configuration, and execution files.
-	        All arguments or options are passed to topology/generator.py
+	        All other arguments or options are passed to topology/generator.py
+	        With --incremental, gen/ is kept and only the ASes whose inputs
+	        changed since the previous run are regenerated.
 	    $PROGRAM run [nobuild]
 	        Run network.
 	    $PROGRAM sciond ISD-AS [ADDR]